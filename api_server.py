@@ -265,10 +265,7 @@ async def initiate_call(request: CallRequest, background_tasks: BackgroundTasks)
         customer_context = context_agent.get_customer_context(request.customer_id)
 
         # Start call in background
-        def process_call():
-            return voicebot_agent.initiate_call(customer_context, {})
-
-        background_tasks.add_task(process_call)
+        background_tasks.add_task(voicebot_agent.initiate_call, customer_context, {})
 
         return {
             "status": "initiated",
@@ -23,6 +23,7 @@ class Settings:
     APP_NAME: str = "EMI VoiceBot System"
     DEBUG: bool = True
     SECRET_KEY: str = "your-secret-key-change-in-production"
+    FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
     # VoiceBot Settings
     VOICE_MODEL: str = "gpt-3.5-turbo"
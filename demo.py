@@ -4,7 +4,6 @@ Demo script to showcase the EMI VoiceBot System end-to-end workflow.
 This script demonstrates all the agents working together.
 """
 
-import asyncio
 import sys
 import os
 
@@ -14,7 +13,7 @@ from src.utils.database import create_tables, get_db_session
 from src.models import Customer, Loan
 from src.agents.trigger_agent import TriggerAgent
 from src.agents.context_agent import ContextAgent
-from src.agents.voicebot_agent import VoiceBotAgent
+from src.agents.voicebot_agent import VoiceBotAgent, run_with_openai_client
 from src.agents.decision_agent import DecisionAgent
 from src.agents.payment_agent import PaymentAgent
 from src.agents.logging_learning_agent import LoggingLearningAgent
@@ -173,7 +172,9 @@ class EMIVoiceBotDemo:
         logger.info("=" * 50)
 
         # Initiate call
-        call_result = self.voicebot_agent.initiate_call(customer_context, emi_info)
+        call_result = run_with_openai_client(
+            self.voicebot_agent.initiate_call(customer_context, emi_info)
+        )
 
         logger.info(f"Call Status: {call_result['status']}")
         logger.info(f"Call Outcome: {call_result['outcome']}")
@@ -4,6 +4,7 @@ Live Demo Script for Presentations
 Real-time demonstration of EMI VoiceBot system with actual API calls
 """
 
+import asyncio
 import os
 import sys
 import time
@@ -15,7 +16,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.agents.trigger_agent import TriggerAgent
 from src.agents.context_agent import ContextAgent
-from src.agents.voicebot_agent import VoiceBotAgent
+from src.agents.voicebot_agent import VoiceBotAgent, run_with_openai_client
 from src.agents.decision_agent import DecisionAgent
 from src.agents.payment_agent import PaymentAgent
 from src.agents.logging_learning_agent import LoggingLearningAgent
@@ -128,8 +129,10 @@ class LiveDemo:
         print("   ✅ Call connected!")
         self.pause_for_effect(1)
 
-        call_result = self.voicebot_agent.initiate_call(
-            customer_context, target_customer["loan_info"]
+        call_result = run_with_openai_client(
+            self.voicebot_agent.initiate_call(
+                customer_context, target_customer["loan_info"]
+            )
         )
 
         self.display_step(
@@ -177,8 +180,10 @@ class LiveDemo:
                     customer_context, target_customer["loan_info"]
                 )
             else:
-                payment_result = self.payment_agent.send_payment_reminder_sms(
-                    customer_context, target_customer["loan_info"]
+                payment_result = asyncio.run(
+                    self.payment_agent.send_payment_reminder_sms(
+                        customer_context, target_customer["loan_info"]
+                    )
                 )
 
             self.display_step(
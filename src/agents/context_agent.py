@@ -1,11 +1,12 @@
-from typing import Dict, List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Union
+from cachetools import TTLCache
+from sqlalchemy import Select, select, update
+from sqlalchemy.orm import Session, selectinload
 from src.utils.database import get_db_session
-from src.models import Customer, Loan, CustomerInteraction, Payment
+from src.models import Customer, Loan, CustomerInteraction
 from src.utils.model_helpers import (
     get_payment_statistics,
     calculate_total_outstanding,
-    filter_active_loans,
     safe_float,
     safe_str,
     safe_int,
@@ -23,8 +24,9 @@ class ContextAgent:
     """
 
     def __init__(self):
-        self.cache = {}  # Simple in-memory cache
-        self.cache_ttl = 300  # 5 minutes cache TTL
+        self.cache_ttl = 60  # 1 minute cache TTL
+        # Contexts keyed by customer_id; expired entries are evicted automatically
+        self.cache = TTLCache(maxsize=10_000, ttl=self.cache_ttl)
 
     def get_customer_context(self, customer_id: int) -> Dict:
         """
@@ -36,26 +38,28 @@ class ContextAgent:
         - Language preference
         """
         # Check cache first
-        cache_key = f"customer_context_{customer_id}"
-        if self._is_cache_valid(cache_key):
-            return self.cache[cache_key]["data"]
+        cached = self.cache.get(customer_id)
+        if cached is not None:
+            return cached
 
         db = get_db_session()
         try:
-            # Get customer basic info
-            customer = db.query(Customer).filter(Customer.id == customer_id).first()
+            # Get customer basic info with active loans loaded in one IN query
+            customer = db.execute(
+                select(Customer)
+                .where(Customer.id == customer_id)
+                .options(selectinload(Customer.loans.and_(Loan.status == "active")))
+            ).scalar_one_or_none()
             if not customer:
                 raise ValueError(f"Customer with ID {customer_id} not found")
 
             # Get loan information
-            loans = (
-                db.query(Loan)
-                .filter(Loan.customer_id == customer_id, Loan.status == "active")
-                .all()
-            )
+            loans = customer.loans
 
-            # Get payment history
-            payment_history = self._get_payment_history(db, customer_id)
+            # Get payment history across all of the customer's loans
+            payment_history = self._get_payment_history(
+                db, select(Loan.id).where(Loan.customer_id == customer_id)
+            )
 
             # Get recent interactions
             recent_interactions = self._get_recent_interactions(db, customer_id)
@@ -68,6 +72,9 @@ class ContextAgent:
                 "customer_id": customer.id,
                 "name": customer.name,
                 "phone_number": customer.phone_number,
+                # Pre-formatted destinations so senders don't rebuild them per message
+                "sms_to": "+91" + (customer.phone_number or ""),
+                "whatsapp_address": "whatsapp:+91" + (customer.phone_number or ""),
                 "email": customer.email,
                 "language_preference": customer.language_preference,
                 "risk_score": risk_score,
@@ -97,7 +104,7 @@ class ContextAgent:
             }
 
             # Cache the context
-            self._cache_data(cache_key, context)
+            self.cache[customer_id] = context
 
             return context
 
@@ -105,23 +112,11 @@ class ContextAgent:
             db.close()
 
     def _get_payment_history(
-        self, db: Session, customer_id: int, months: int = 6
+        self, db: Session, loan_ids: Union[List[int], Select], months: int = 6
     ) -> Dict:
-        """Get customer's payment history for the last N months"""
+        """Get payment history across the customer's loans for the last N months"""
         cutoff_date = datetime.now() - timedelta(days=months * 30)
 
-        # Get all loans for the customer
-        loan_ids = db.query(Loan.id).filter(Loan.customer_id == customer_id).all()
-        loan_ids = [lid[0] for lid in loan_ids]
-
-        # Get payments
-        payments = (
-            db.query(Payment)
-            .filter(Payment.loan_id.in_(loan_ids), Payment.created_at >= cutoff_date)
-            .order_by(Payment.payment_date.desc())
-            .all()
-        )
-
         # Calculate statistics using helper function
         return get_payment_statistics(db, loan_ids, cutoff_date)
 
@@ -235,25 +230,75 @@ class ContextAgent:
         elif payment_history["payment_pattern"] == "poor":
             context_parts.append("Irregular payment pattern")
 
-        # Current dues
-        active_loans = filter_active_loans(loans)
-        if active_loans:
-            total_due = calculate_total_outstanding(active_loans)
+        # Current dues (loans are already limited to active ones by the query)
+        if loans:
+            total_due = calculate_total_outstanding(loans)
             context_parts.append(f"Total outstanding: ₹{total_due:,.2f}")
 
         return " | ".join(context_parts)
 
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cache entry is still valid"""
-        if cache_key not in self.cache:
-            return False
+    def invalidate_customer_context(self, customer_id: int):
+        """Drop the cached context so the next lookup rebuilds it"""
+        self.cache.pop(customer_id, None)
 
-        cached_time = self.cache[cache_key]["timestamp"]
-        return (datetime.now() - cached_time).seconds < self.cache_ttl
+    def refresh_risk_score(self, customer_id: int) -> float:
+        """
+        Recompute and store the customer's risk score, and drop the cached
+        context. Call after any write to the customer's loans or payments so
+        due-EMI prioritisation can rank on Customer.risk_score in SQL.
+        """
+        self.invalidate_customer_context(customer_id)
 
-    def _cache_data(self, cache_key: str, data: Dict):
-        """Cache data with timestamp"""
-        self.cache[cache_key] = {"data": data, "timestamp": datetime.now()}
+        db = get_db_session()
+        try:
+            customer = db.execute(
+                select(Customer)
+                .where(Customer.id == customer_id)
+                .options(selectinload(Customer.loans.and_(Loan.status == "active")))
+            ).scalar_one_or_none()
+            if not customer:
+                raise ValueError(f"Customer with ID {customer_id} not found")
+
+            payment_history = self._get_payment_history(
+                db, select(Loan.id).where(Loan.customer_id == customer_id)
+            )
+            risk_score = self._calculate_risk_score(
+                customer, customer.loans, payment_history
+            )
+
+            if customer.risk_score != risk_score:
+                db.execute(
+                    update(Customer)
+                    .where(Customer.id == customer_id)
+                    .values(risk_score=risk_score)
+                )
+                db.commit()
+
+            return risk_score
+
+        finally:
+            db.close()
+
+    def refresh_risk_scores(self, customer_ids: Optional[List[int]] = None):
+        """
+        Refresh the stored risk scores of the given customers, or of all
+        customers. Payments ageing out of the history window change scores
+        without any write, so this also runs periodically.
+        """
+        if customer_ids is None:
+            db = get_db_session()
+            try:
+                customer_ids = db.execute(select(Customer.id)).scalars().all()
+            finally:
+                db.close()
+
+        for customer_id in customer_ids:
+            try:
+                self.refresh_risk_score(customer_id)
+            except Exception as e:
+                logger.error(
+                    f"Error refreshing risk score for customer {customer_id}: {str(e)}"
+                )
 
     def update_customer_context(
         self,
@@ -263,9 +308,7 @@ class ContextAgent:
     ):
         """Update customer context after an interaction"""
         # Invalidate cache
-        cache_key = f"customer_context_{customer_id}"
-        if cache_key in self.cache:
-            del self.cache[cache_key]
+        self.invalidate_customer_context(customer_id)
 
         # Log the update
         logger.info(
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict, List, Optional
 import logging
 from datetime import datetime, timedelta
@@ -111,6 +112,16 @@ class DecisionAgent:
 
         return final_decision
 
+    async def make_decision_async(
+        self, conversation_result: Dict, customer_context: Dict
+    ) -> Dict:
+        """
+        Make decision in a worker thread so it can overlap other awaits.
+        """
+        return await asyncio.to_thread(
+            self.make_decision, conversation_result, customer_context
+        )
+
     def _enhance_decision_with_context(
         self, base_decision: Dict, customer_context: Dict, conversation_result: Dict
     ) -> Dict:
@@ -1,18 +1,74 @@
-import razorpay
-from twilio.rest import Client
-import requests
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+import asyncio
+import os
+import time
 import uuid
+import random
 import logging
+from functools import lru_cache
 from datetime import datetime, timedelta
-from sqlalchemy import update
+from sqlalchemy import case, func, insert, select, update
 from src.models import Payment, Loan
 from src.utils.database import get_db_session
+from src.agents.context_agent import ContextAgent
+from src.utils.messaging import MessageDispatcher
 from src.utils.model_helpers import safe_float, safe_str, safe_datetime, safe_int
 import json
 
 logger = logging.getLogger(__name__)
 
+# Payment links expire 24 hours after creation (milliseconds, as Razorpay expects)
+PAYMENT_LINK_TTL_MS = 86_400_000
+
+# Maximum rows per bulk INSERT statement when fanning out payment links
+BULK_INSERT_BATCH_SIZE = 500
+
+_rand = random.SystemRandom()
+
+
+def _short_id() -> str:
+    """Return an 8-character hex identifier for message/transaction SIDs."""
+    return f"{_rand.getrandbits(32):08x}"
+
+
+def _to_paise(amount: float) -> int:
+    """Convert a rupee amount to integer paise, rounding instead of truncating."""
+    return round(amount * 100)
+
+
+def _sms_to(customer_context: Dict) -> str:
+    """
+    SMS destination in E.164 form ("+91" + phone number). ContextAgent
+    precomputes it; contexts built elsewhere fall back to phone_number.
+    """
+    return customer_context.get("sms_to") or f"+91{customer_context['phone_number']}"
+
+
+def _whatsapp_address(customer_context: Dict) -> str:
+    """WhatsApp destination, precomputed by ContextAgent when available."""
+    return (
+        customer_context.get("whatsapp_address")
+        or f"whatsapp:+91{customer_context['phone_number']}"
+    )
+
+
+@lru_cache(maxsize=1)
+def _razorpay_client():
+    """Create the Razorpay client on first use; the SDK is imported lazily."""
+    import razorpay
+
+    return razorpay.Client(
+        auth=(os.getenv("RAZORPAY_KEY_ID"), os.getenv("RAZORPAY_SECRET_KEY"))
+    )
+
+
+@lru_cache(maxsize=1)
+def _twilio_client():
+    """Create the Twilio client on first use; the SDK is imported lazily."""
+    from twilio.rest import Client
+
+    return Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+
 
 class PaymentAgent:
     """
@@ -20,9 +76,9 @@ class PaymentAgent:
     Integrates with payment gateways and messaging services.
     """
 
-    def __init__(self):
-        self.razorpay_client = None  # Initialize when needed
-        self.twilio_client = None  # Initialize when needed
+    def __init__(self, context_agent: Optional[ContextAgent] = None):
+        # Keeps stored risk scores current after payment writes
+        self.context_agent = context_agent or ContextAgent()
 
         # Payment methods configuration
         self.payment_methods = {
@@ -48,6 +104,52 @@ class PaymentAgent:
             },
         }
 
+        # Outbound channels for reminders and notifications
+        self.dispatcher = MessageDispatcher(
+            {"sms": self._send_sms, "whatsapp": self._send_whatsapp}
+        )
+
+    def _refresh_risk_scores(self, loan_ids: List[int]):
+        """
+        Refresh the risk scores of the customers owning these loans, after
+        their payments changed.
+        """
+        db = get_db_session()
+        try:
+            customer_ids = (
+                db.execute(
+                    select(Loan.customer_id).where(Loan.id.in_(loan_ids)).distinct()
+                )
+                .scalars()
+                .all()
+            )
+        finally:
+            db.close()
+
+        self.context_agent.refresh_risk_scores(customer_ids)
+
+    async def _send_sms(self, to: str, message: str) -> Dict:
+        """
+        Async SMS channel used by the message dispatcher.
+        """
+        return self._simulate_sms_send(to, message)
+
+    async def _send_whatsapp(self, to: str, message: str) -> Dict:
+        """
+        Async WhatsApp channel used by the message dispatcher.
+        """
+        return self._simulate_whatsapp_send(to, message)
+
+    @property
+    def razorpay_client(self):
+        """Shared Razorpay client, created on first access."""
+        return _razorpay_client()
+
+    @property
+    def twilio_client(self):
+        """Shared Twilio client, created on first access."""
+        return _twilio_client()
+
     def create_payment_link(
         self,
         customer_context: Dict,
@@ -71,28 +173,126 @@ class PaymentAgent:
             )
 
             # Store payment record
-            loan_id = (
-                loan_info.get("loan_id", 0)
-                if isinstance(loan_info.get("loan_id"), int)
-                else 0
+            loan_id = self._resolve_loan_id(loan_info)
+            self._create_payment_record(loan_id, amount, payment_id, "payment_link")
+            self._refresh_risk_scores([loan_id])
+
+            return self._build_payment_link_response(
+                payment_id, amount, payment_link_data
+            )
+
+        except Exception as e:
+            logger.error("Error creating payment link: %s", e)
+            return {"error": "Failed to create payment link", "details": str(e)}
+
+    async def create_payment_link_async(
+        self,
+        customer_context: Dict,
+        loan_info: Dict,
+        custom_amount: Optional[float] = None,
+    ) -> Dict:
+        """
+        Create a payment link in a worker thread so it can overlap other awaits.
+        """
+        return await asyncio.to_thread(
+            self.create_payment_link, customer_context, loan_info, custom_amount
+        )
+
+    def create_payment_links_bulk(
+        self, contexts_and_loans: List[Tuple[Dict, Dict]]
+    ) -> List[Dict]:
+        """
+        Create payment links for many customers at once.
+        All pending payment records are written in a single transaction.
+        """
+        rows = []
+        links = []
+
+        for customer_context, loan_info in contexts_and_loans:
+            amount = loan_info.get("emi_amount", 0)
+            payment_id = str(uuid.uuid4())
+            payment_link_data = self._simulate_razorpay_payment_link(
+                customer_context, amount, payment_id
+            )
+            rows.append(
+                {
+                    "loan_id": self._resolve_loan_id(loan_info),
+                    "amount": amount,
+                    "payment_method": "payment_link",
+                    "transaction_id": payment_id,
+                    "status": "pending",
+                }
             )
-            payment_record = self._create_payment_record(
-                loan_id, amount, payment_id, "payment_link"
+            links.append(
+                self._build_payment_link_response(payment_id, amount, payment_link_data)
             )
 
-            return {
-                "payment_id": payment_id,
-                "payment_link": payment_link_data["short_url"],
-                "amount": amount,
-                "currency": "INR",
-                "expires_at": payment_link_data["expires_at"],
-                "status": "created",
-                "payment_methods": list(self.payment_methods.keys()),
-            }
+        db = get_db_session()
+        try:
+            for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+                db.bulk_insert_mappings(
+                    Payment, rows[start : start + BULK_INSERT_BATCH_SIZE]
+                )
+            db.commit()
+            self._refresh_risk_scores(list({row["loan_id"] for row in rows}))
+            return links
 
         except Exception as e:
-            logger.error(f"Error creating payment link: {str(e)}")
-            return {"error": "Failed to create payment link", "details": str(e)}
+            db.rollback()
+            logger.error("Error creating payment links in bulk: %s", e)
+            error = {"error": "Failed to create payment link", "details": str(e)}
+            return [dict(error) for _ in links]
+        finally:
+            db.close()
+
+    def send_payment_links_bulk(
+        self, contexts_and_loans: List[Tuple[Dict, Dict]], channel: str = "sms"
+    ) -> List[Dict]:
+        """
+        Create and send payment links for many customers via SMS or WhatsApp.
+        """
+        payment_links = self.create_payment_links_bulk(contexts_and_loans)
+
+        results = []
+        for (customer_context, loan_info), payment_link_data in zip(
+            contexts_and_loans, payment_links
+        ):
+            if "error" in payment_link_data:
+                results.append(payment_link_data)
+            elif channel == "whatsapp":
+                results.append(
+                    self.send_payment_link_whatsapp(customer_context, payment_link_data)
+                )
+            else:
+                results.append(
+                    self.send_payment_link_sms(
+                        customer_context, payment_link_data, loan_info.get("due_date")
+                    )
+                )
+        return results
+
+    def _resolve_loan_id(self, loan_info: Dict) -> int:
+        """
+        Extract the numeric loan id from loan info, defaulting to 0.
+        """
+        loan_id = loan_info.get("loan_id")
+        return loan_id if isinstance(loan_id, int) else 0
+
+    def _build_payment_link_response(
+        self, payment_id: str, amount: float, payment_link_data: Dict
+    ) -> Dict:
+        """
+        Build the API payload describing a created payment link.
+        """
+        return {
+            "payment_id": payment_id,
+            "payment_link": payment_link_data["short_url"],
+            "amount": amount,
+            "currency": "INR",
+            "expires_at": payment_link_data["expires_at"],
+            "status": "created",
+            "payment_methods": list(self.payment_methods.keys()),
+        }
 
     def _simulate_razorpay_payment_link(
         self, customer_context: Dict, amount: float, payment_id: str
@@ -102,12 +302,13 @@ class PaymentAgent:
         In production, this would use actual Razorpay API.
         """
         # Simulate API call to Razorpay
+        short_id = payment_id[:8]
         return {
-            "id": f"plink_{payment_id[:8]}",
-            "short_url": f"https://rzp.io/l/{payment_id[:8]}",
-            "amount": int(amount * 100),  # Razorpay uses paise
+            "id": f"plink_{short_id}",
+            "short_url": f"https://rzp.io/l/{short_id}",
+            "amount": _to_paise(amount),  # Razorpay uses paise
             "currency": "INR",
-            "expires_at": int((datetime.now().timestamp() + 86400) * 1000),  # 24 hours
+            "expires_at": time.time_ns() // 1_000_000 + PAYMENT_LINK_TTL_MS,
             "status": "created",
             "customer": {
                 "name": customer_context["name"],
@@ -124,6 +325,7 @@ class PaymentAgent:
     ) -> Dict:
         """
         Send payment link via SMS to customer.
+        The message is addressed to "+91<phone_number>", not the bare number.
         """
         try:
             language = customer_context.get("language_preference", "en")
@@ -139,19 +341,18 @@ class PaymentAgent:
             )
 
             # For demo purposes, simulate SMS sending
-            sms_result = self._simulate_sms_send(
-                customer_context["phone_number"], message
-            )
+            sms_to = _sms_to(customer_context)
+            sms_result = self._simulate_sms_send(sms_to, message)
 
             return {
                 "status": "sent",
                 "message_id": sms_result["sid"],
-                "to": customer_context["phone_number"],
+                "to": sms_to,
                 "message": message,
             }
 
         except Exception as e:
-            logger.error(f"Error sending payment link SMS: {str(e)}")
+            logger.error("Error sending payment link SMS: %s", e)
             return {"status": "failed", "error": str(e)}
 
     def send_payment_link_whatsapp(
@@ -174,19 +375,18 @@ class PaymentAgent:
             )
 
             # For demo purposes, simulate WhatsApp sending
-            whatsapp_result = self._simulate_whatsapp_send(
-                customer_context["phone_number"], message
-            )
+            whatsapp_address = _whatsapp_address(customer_context)
+            whatsapp_result = self._simulate_whatsapp_send(whatsapp_address, message)
 
             return {
                 "status": "sent",
                 "message_id": whatsapp_result["sid"],
-                "to": f"whatsapp:+91{customer_context['phone_number']}",
+                "to": whatsapp_address,
                 "message": message,
             }
 
         except Exception as e:
-            logger.error(f"Error sending payment link WhatsApp: {str(e)}")
+            logger.error("Error sending payment link WhatsApp: %s", e)
             return {"status": "failed", "error": str(e)}
 
     def _simulate_sms_send(self, phone_number: str, message: str) -> Dict:
@@ -194,20 +394,20 @@ class PaymentAgent:
         Simulate SMS sending via Twilio.
         """
         return {
-            "sid": f"SM{uuid.uuid4().hex[:8]}",
+            "sid": f"SM{_short_id()}",
             "status": "queued",
             "to": phone_number,
             "body": message,
         }
 
-    def _simulate_whatsapp_send(self, phone_number: str, message: str) -> Dict:
+    def _simulate_whatsapp_send(self, whatsapp_address: str, message: str) -> Dict:
         """
         Simulate WhatsApp message sending via Twilio.
         """
         return {
-            "sid": f"WA{uuid.uuid4().hex[:8]}",
+            "sid": f"WA{_short_id()}",
             "status": "queued",
-            "to": f"whatsapp:+91{phone_number}",
+            "to": whatsapp_address,
             "body": message,
         }
 
@@ -239,11 +439,13 @@ class PaymentAgent:
             )
 
             if verification_result["status"] == "success":
+                now = datetime.utcnow()
+
                 # Update payment record using SQLAlchemy update
                 db.execute(
                     update(Payment)
                     .where(Payment.id == payment.id)
-                    .values(status="completed", payment_date=datetime.utcnow())
+                    .values(status="completed", payment_date=func.now())
                 )
                 db.commit()
 
@@ -251,6 +453,7 @@ class PaymentAgent:
                 self._update_loan_outstanding(
                     safe_int(payment.loan_id), safe_float(payment.amount)
                 )
+                self._refresh_risk_scores([safe_int(payment.loan_id)])
 
                 # Send confirmation message
                 confirmation_result = self._send_payment_confirmation(payment)
@@ -259,7 +462,7 @@ class PaymentAgent:
                     "status": "success",
                     "payment_id": payment_id,
                     "amount": safe_float(payment.amount),
-                    "transaction_date": datetime.utcnow().isoformat(),
+                    "transaction_date": now.isoformat(),
                     "confirmation_sent": confirmation_result["status"] == "sent",
                 }
             else:
@@ -270,6 +473,7 @@ class PaymentAgent:
                     .values(status="failed")
                 )
                 db.commit()
+                self._refresh_risk_scores([safe_int(payment.loan_id)])
 
                 return {
                     "status": "failed",
@@ -280,7 +484,7 @@ class PaymentAgent:
                 }
 
         except Exception as e:
-            logger.error(f"Error verifying payment: {str(e)}")
+            logger.error("Error verifying payment: %s", e)
             return {"status": "error", "message": str(e)}
         finally:
             if db is not None:
@@ -293,13 +497,10 @@ class PaymentAgent:
         Simulate payment verification with Razorpay.
         """
         # For demo, randomly simulate success/failure
-        import random
-
         if random.random() > 0.1:  # 90% success rate
             return {
                 "status": "success",
-                "razorpay_payment_id": razorpay_payment_id
-                or f"pay_{uuid.uuid4().hex[:8]}",
+                "razorpay_payment_id": razorpay_payment_id or f"pay_{_short_id()}",
                 "method": "upi",
             }
         else:
@@ -307,24 +508,26 @@ class PaymentAgent:
 
     def _create_payment_record(
         self, loan_id: int, amount: float, transaction_id: str, payment_method: str
-    ) -> Payment:
+    ) -> int:
         """
-        Create payment record in database.
+        Create payment record in database and return its id.
+        Uses INSERT ... RETURNING so no follow-up SELECT is needed.
         """
         db = get_db_session()
         try:
-            payment = Payment(
-                loan_id=loan_id,
-                amount=amount,
-                payment_method=payment_method,
-                transaction_id=transaction_id,
-                status="pending",
-                created_at=datetime.utcnow(),
-            )
-            db.add(payment)
+            payment_id = db.execute(
+                insert(Payment)
+                .values(
+                    loan_id=loan_id,
+                    amount=amount,
+                    payment_method=payment_method,
+                    transaction_id=transaction_id,
+                    status="pending",
+                )
+                .returning(Payment.id)
+            ).scalar_one()
             db.commit()
-            db.refresh(payment)
-            return payment
+            return payment_id
         finally:
             db.close()
 
@@ -334,19 +537,17 @@ class PaymentAgent:
         """
         db = get_db_session()
         try:
-            loan = db.query(Loan).filter(Loan.id == loan_id).first()
-            if loan:
-                current_outstanding = safe_float(loan.outstanding_amount)
-                new_outstanding = max(0, current_outstanding - payment_amount)
-
-                db.execute(
-                    update(Loan)
-                    .where(Loan.id == loan_id)
-                    .values(outstanding_amount=new_outstanding)
-                )
-                db.commit()
+            # Single atomic UPDATE, clamped at zero; a CASE expression keeps it
+            # portable across PostgreSQL (GREATEST) and SQLite (scalar MAX)
+            remaining = Loan.outstanding_amount - payment_amount
+            db.execute(
+                update(Loan)
+                .where(Loan.id == loan_id)
+                .values(outstanding_amount=case((remaining > 0, remaining), else_=0))
+            )
+            db.commit()
         except Exception as e:
-            logger.error(f"Error updating loan outstanding: {str(e)}")
+            logger.error("Error updating loan outstanding: %s", e)
         finally:
             db.close()
 
@@ -379,13 +580,13 @@ class PaymentAgent:
             return {"status": "sent", "message_id": sms_result["sid"]}
 
         except Exception as e:
-            logger.error(f"Error sending payment confirmation: {str(e)}")
+            logger.error("Error sending payment confirmation: %s", e)
             return {"status": "failed", "error": str(e)}
         finally:
             if db is not None:
                 db.close()
 
-    def send_payment_reminder_sms(
+    async def send_payment_reminder_sms(
         self, customer_context: Dict, loan_info: Dict, due_date: Optional[str] = None
     ) -> Dict[str, Any]:
         """
@@ -419,36 +620,29 @@ class PaymentAgent:
                 link=payment_link_data["payment_link"],
             )
 
-            # Send reminder via preferred channel
+            # Urgent reminders go out on SMS and WhatsApp together
             if days_until_due <= 1:
-                # Urgent - send both SMS and WhatsApp
-                sms_result = self._simulate_sms_send(
-                    customer_context["phone_number"], message
-                )
-                whatsapp_result = self._simulate_whatsapp_send(
-                    customer_context["phone_number"], message
-                )
-
-                return {
-                    "status": "sent",
-                    "channels": ["sms", "whatsapp"],
-                    "sms_id": sms_result["sid"],
-                    "whatsapp_id": whatsapp_result["sid"],
+                destinations = {
+                    "sms": _sms_to(customer_context),
+                    "whatsapp": _whatsapp_address(customer_context),
                 }
             else:
                 # Normal reminder - SMS only
-                sms_result = self._simulate_sms_send(
-                    customer_context["phone_number"], message
-                )
+                destinations = {"sms": _sms_to(customer_context)}
 
-                return {
-                    "status": "sent",
-                    "channels": ["sms"],
-                    "sms_id": sms_result["sid"],
-                }
+            results = await self.dispatcher.broadcast(destinations, message)
+
+            return {
+                "status": "sent",
+                "channels": list(results),
+                **{
+                    f"{channel}_id": result["sid"]
+                    for channel, result in results.items()
+                },
+            }
 
         except Exception as e:
-            logger.error(f"Error sending payment reminder: {str(e)}")
+            logger.error("Error sending payment reminder: %s", e)
             return {"status": "failed", "error": str(e)}
 
     def get_payment_status(self, payment_id: str) -> Dict:
@@ -480,7 +674,7 @@ class PaymentAgent:
             }
 
         except Exception as e:
-            logger.error(f"Error getting payment status: {str(e)}")
+            logger.error("Error getting payment status: %s", e)
             return {"status": "error", "message": str(e)}
         finally:
             db.close()
@@ -493,32 +687,47 @@ class PaymentAgent:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
 
-            payments = db.query(Payment).filter(Payment.created_at >= cutoff_date).all()
-
-            total_payments = len(payments)
-            successful_payments = len(
-                [p for p in payments if safe_str(p.status) == "completed"]
-            )
-            failed_payments = len(
-                [p for p in payments if safe_str(p.status) == "failed"]
-            )
-            pending_payments = len(
-                [p for p in payments if safe_str(p.status) == "pending"]
+            totals = (
+                db.query(
+                    func.count(Payment.id).label("total"),
+                    func.count(Payment.id)
+                    .filter(Payment.status == "completed")
+                    .label("completed"),
+                    func.count(Payment.id)
+                    .filter(Payment.status == "failed")
+                    .label("failed"),
+                    func.count(Payment.id)
+                    .filter(Payment.status == "pending")
+                    .label("pending"),
+                    func.coalesce(
+                        func.sum(
+                            case(
+                                (Payment.status == "completed", Payment.amount),
+                                else_=0,
+                            )
+                        ),
+                        0,
+                    ).label("amount"),
+                )
+                .filter(Payment.created_at >= cutoff_date)
+                .one()
             )
 
-            total_amount = sum(
-                [
-                    safe_float(p.amount)
-                    for p in payments
-                    if safe_str(p.status) == "completed"
-                ]
-            )
+            total_payments = totals.total
+            successful_payments = totals.completed
+            failed_payments = totals.failed
+            pending_payments = totals.pending
+            total_amount = float(totals.amount)
 
             # Payment method distribution
-            method_distribution = {}
-            for payment in payments:
-                method = safe_str(payment.payment_method)
-                method_distribution[method] = method_distribution.get(method, 0) + 1
+            method_distribution = {
+                safe_str(method): count
+                for method, count in db.query(
+                    Payment.payment_method, func.count(Payment.id)
+                )
+                .filter(Payment.created_at >= cutoff_date)
+                .group_by(Payment.payment_method)
+            }
 
             return {
                 "period_days": days,
@@ -537,7 +746,7 @@ class PaymentAgent:
             }
 
         except Exception as e:
-            logger.error(f"Error getting payment analytics: {str(e)}")
+            logger.error("Error getting payment analytics: %s", e)
             return {"error": "Failed to get analytics", "details": str(e)}
         finally:
             db.close()
@@ -1,13 +1,13 @@
 import schedule
 import time
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import case, func, or_, select
 from sqlalchemy.orm import Session
 from src.utils.database import get_db_session
-from src.utils.model_helpers import safe_int
-from src.models import Customer, Loan
+from src.models import Customer, CustomerInteraction, Loan
 from src.agents.context_agent import ContextAgent
-from src.agents.voicebot_agent import VoiceBotAgent
+from src.agents.voicebot_agent import VoiceBotAgent, run_with_openai_client
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -20,96 +20,178 @@ class TriggerAgent:
     Triggers voice calls based on predefined business rules.
     """
 
-    def __init__(self):
-        self.context_agent = ContextAgent()
-        self.voicebot_agent = VoiceBotAgent()
+    def __init__(
+        self,
+        context_agent: Optional[ContextAgent] = None,
+        voicebot_agent: Optional[VoiceBotAgent] = None,
+    ):
+        self.context_agent = context_agent or ContextAgent()
+        self.voicebot_agent = voicebot_agent or VoiceBotAgent()
         self.reminder_days = [7, 3, 1, 0]  # Days before due date to trigger calls
+        # Optional cap on top-priority calls per scheduled slot (None = no cap)
+        self.max_calls_per_run: Optional[int] = None
 
-    def check_due_emis(self) -> List[dict]:
+    def check_due_emis(
+        self, limit: Optional[int] = None, offset: int = 0
+    ) -> List[dict]:
         """
         Check for EMIs that are due or approaching due date.
-        Returns list of customers requiring calls.
+        Returns list of customers requiring calls, highest priority first.
+        Priority is computed and sorted in SQL so only `limit` rows
+        (default: max_calls_per_run, if set) starting at `offset` are loaded.
         """
+        if limit is None:
+            limit = self.max_calls_per_run
+
         db = get_db_session()
         try:
-            upcoming_dues = []
-            today = datetime.now()
-
-            for days_ahead in self.reminder_days:
-                target_date = today + timedelta(days=days_ahead)
-
-                # Query loans with due dates
-                loans = (
-                    db.query(Loan)
-                    .filter(
-                        Loan.next_due_date.between(
-                            target_date.replace(hour=0, minute=0, second=0),
-                            target_date.replace(hour=23, minute=59, second=59),
-                        ),
-                        Loan.status == "active",
-                    )
-                    .all()
-                )
+            query = self._due_emis_query(db, datetime.now()).offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
 
-                for loan in loans:
-                    customer_context = self.context_agent.get_customer_context(
-                        safe_int(loan.customer_id)
-                    )
-
-                    upcoming_dues.append(
-                        {
-                            "loan_id": loan.id,
-                            "customer_id": loan.customer_id,
-                            "customer_name": customer_context["name"],
-                            "phone_number": customer_context["phone_number"],
-                            "emi_amount": loan.emi_amount,
-                            "due_date": loan.next_due_date,
-                            "days_until_due": days_ahead,
-                            "outstanding_amount": loan.outstanding_amount,
-                            "priority": self._calculate_priority(
-                                customer_context, days_ahead
-                            ),
-                        }
-                    )
-
-            return sorted(upcoming_dues, key=lambda x: x["priority"], reverse=True)
+            return [self._due_emi_entry(row) for row in query]
 
         finally:
             db.close()
 
-    def _calculate_priority(self, customer_context: dict, days_until_due: int) -> int:
+    def iter_due_emis(self, batch_size: int = 500) -> Iterator[dict]:
         """
-        Calculate priority score for calling customer.
-        Higher score = higher priority
+        Yield every due EMI, highest priority first, fetching `batch_size`
+        rows at a time so the full set is never held in memory.
+        """
+        db = get_db_session()
+        try:
+            query = self._due_emis_query(db, datetime.now()).yield_per(batch_size)
+            for row in query:
+                yield self._due_emi_entry(row)
+
+        finally:
+            db.close()
+
+    def _due_emis_query(self, db: Session, today: datetime):
+        """
+        Query of due loans with their customer, priority and days until due,
+        highest priority first.
+        """
+        due_windows = self._due_date_windows(today)
+        priority = self._priority_expression(today, due_windows).label("priority")
+        days_until_due = case(
+            *[
+                (Loan.next_due_date.between(start, end), days_ahead)
+                for days_ahead, start, end in due_windows
+            ]
+        ).label("days_until_due")
+
+        return (
+            db.query(
+                Loan, Customer.name, Customer.phone_number, priority, days_until_due
+            )
+            .join(Customer, Customer.id == Loan.customer_id)
+            .filter(*self._due_loan_filters(due_windows))
+            .order_by(priority.desc(), Loan.id)
+        )
+
+    def _due_emi_entry(self, row) -> dict:
+        """
+        Build a due-EMI entry from a _due_emis_query row.
         """
-        priority = 100
+        loan, customer_name, phone_number, priority, days_until_due = row
+        return {
+            "loan_id": loan.id,
+            "customer_id": loan.customer_id,
+            "customer_name": customer_name,
+            "phone_number": phone_number,
+            "emi_amount": loan.emi_amount,
+            "due_date": loan.next_due_date,
+            "days_until_due": days_until_due,
+            "outstanding_amount": loan.outstanding_amount,
+            "priority": int(priority),
+        }
 
-        # Risk score factor
-        priority += customer_context.get("risk_score", 0) * 20
+    def count_due_emis(self) -> int:
+        """
+        Count EMIs that are due or approaching due date without loading them.
+        """
+        db = get_db_session()
+        try:
+            due_windows = self._due_date_windows(datetime.now())
+            return db.execute(
+                select(func.count(Loan.id)).where(*self._due_loan_filters(due_windows))
+            ).scalar_one()
+
+        finally:
+            db.close()
 
+    def _due_loan_filters(self, due_windows: List[Tuple[int, datetime, datetime]]):
+        """
+        SQL filters selecting active loans that fall in a reminder window.
+        """
+        return (
+            or_(
+                *[
+                    Loan.next_due_date.between(start, end)
+                    for _, start, end in due_windows
+                ]
+            ),
+            Loan.status == "active",
+        )
+
+    def _due_date_windows(
+        self, today: datetime
+    ) -> List[Tuple[int, datetime, datetime]]:
+        """
+        Build (days_ahead, day_start, day_end) windows for each reminder day.
+        """
+        windows = []
+        for days_ahead in self.reminder_days:
+            target_date = today + timedelta(days=days_ahead)
+            windows.append(
+                (
+                    days_ahead,
+                    target_date.replace(hour=0, minute=0, second=0),
+                    target_date.replace(hour=23, minute=59, second=59),
+                )
+            )
+        return windows
+
+    def _priority_expression(
+        self, today: datetime, due_windows: List[Tuple[int, datetime, datetime]]
+    ):
+        """
+        SQL expression for the calling priority score.
+        Higher score = higher priority
+        """
         # Days until due factor
-        if days_until_due == 0:
-            priority += 50  # Due today
-        elif days_until_due == 1:
-            priority += 30  # Due tomorrow
-        elif days_until_due == 3:
-            priority += 15  # Due in 3 days
-
-        # Previous interaction factor
-        recent_interactions = customer_context.get("recent_interactions", [])
-        interaction_count = (
-            len(recent_interactions)
-            if isinstance(recent_interactions, list)
-            else recent_interactions
+        due_bonus = {0: 50, 1: 30, 3: 15}  # Due today / tomorrow / in 3 days
+        days_factor = case(
+            *[
+                (Loan.next_due_date.between(start, end), due_bonus[days_ahead])
+                for days_ahead, start, end in due_windows
+                if days_ahead in due_bonus
+            ],
+            else_=0,
+        )
+
+        # Previous interaction factor - haven't called much recently
+        recent_interactions = (
+            select(func.count(CustomerInteraction.id))
+            .where(
+                CustomerInteraction.customer_id == Loan.customer_id,
+                CustomerInteraction.created_at >= today - timedelta(days=30),
+            )
+            .scalar_subquery()
         )
-        if interaction_count < 2:
-            priority += 10  # Haven't called much recently
+        interaction_factor = case((recent_interactions < 2, 10), else_=0)
 
-        return int(priority)
+        # Risk score factor; ContextAgent.refresh_risk_score keeps it current
+        risk_factor = func.coalesce(Customer.risk_score, 0) * 20
 
-    def trigger_voice_calls(self):
+        return 100 + risk_factor + days_factor + interaction_factor
+
+    async def trigger_voice_calls(self):
         """
         Main method to trigger voice calls for due EMIs.
+        Calls run concurrently through the voicebot campaign runner.
         """
         logger.info("Starting EMI due check and voice call triggers...")
 
@@ -119,27 +201,36 @@ class TriggerAgent:
             logger.info("No EMIs due for calling today.")
             return
 
-        logger.info(f"Found {len(due_emis)} customers requiring calls")
-
-        for emi_info in due_emis:
-            try:
-                # Get full customer context
-                customer_context = self.context_agent.get_customer_context(
-                    emi_info["customer_id"]
-                )
+        logger.info("Found %d customers requiring calls", len(due_emis))
 
-                # Trigger voice call
-                call_result = self.voicebot_agent.initiate_call(
-                    customer_context=customer_context, emi_info=emi_info
-                )
+        # One context lookup per customer, shared by all of their due loans
+        customer_contexts = {
+            customer_id: self.context_agent.get_customer_context(customer_id)
+            for customer_id in {emi_info["customer_id"] for emi_info in due_emis}
+        }
+        call_results = await self.voicebot_agent.run_campaign(
+            [
+                (customer_contexts[emi_info["customer_id"]], emi_info)
+                for emi_info in due_emis
+            ]
+        )
 
-                logger.info(
-                    f"Call initiated for customer {emi_info['customer_name']}: {call_result}"
-                )
+        # The calls added interactions, so rebuild these contexts on next use
+        for customer_id in customer_contexts:
+            self.context_agent.invalidate_customer_context(customer_id)
 
-            except Exception as e:
+        for emi_info, call_result in zip(due_emis, call_results):
+            if call_result.get("status") == "failed":
                 logger.error(
-                    f"Error triggering call for customer {emi_info['customer_id']}: {str(e)}"
+                    "Error triggering call for customer %s: %s",
+                    emi_info["customer_id"],
+                    call_result.get("error"),
+                )
+            elif logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "Call initiated for customer %s: %s",
+                    emi_info["customer_name"],
+                    call_result,
                 )
 
     def schedule_daily_checks(self):
@@ -147,11 +238,17 @@ class TriggerAgent:
         Schedule daily EMI checks at specific times.
         """
         # Schedule calls at 10 AM and 3 PM
-        schedule.every().day.at("10:00").do(self.trigger_voice_calls)
-        schedule.every().day.at("15:00").do(self.trigger_voice_calls)
+        schedule.every().day.at("10:00").do(self._run_trigger_voice_calls)
+        schedule.every().day.at("15:00").do(self._run_trigger_voice_calls)
 
         logger.info("Scheduled daily EMI checks at 10:00 AM and 3:00 PM")
 
+    def _run_trigger_voice_calls(self):
+        """
+        Synchronous entry point for the scheduler.
+        """
+        run_with_openai_client(self.trigger_voice_calls())
+
     def run_scheduler(self):
         """
         Run the scheduler continuously.
@@ -163,18 +260,19 @@ class TriggerAgent:
             schedule.run_pending()
             time.sleep(60)  # Check every minute
 
-    def manual_trigger(self, customer_id: Optional[int] = None):
+    async def manual_trigger(self, customer_id: Optional[int] = None):
         """
         Manually trigger calls for testing purposes.
         """
         if customer_id:
             customer_context = self.context_agent.get_customer_context(customer_id)
-            call_result = self.voicebot_agent.initiate_call(
+            call_result = await self.voicebot_agent.initiate_call(
                 customer_context=customer_context, emi_info={"manual_trigger": True}
             )
+            self.context_agent.invalidate_customer_context(customer_id)
             return call_result
         else:
-            return self.trigger_voice_calls()
+            return await self.trigger_voice_calls()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,361 @@
+import asyncio
+import os
+import shutil
+import string
+import httpx
+import keyword
 import openai
-from twilio.rest import Client
-from typing import Dict, List, Optional
-import json
+from collections import ChainMap, deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Deque, Dict, Final, List, Mapping, Optional, Tuple
 import logging
-from datetime import datetime
+import numpy as np
+import orjson
+from cachetools import LRUCache
+from tenacity import retry, stop_after_attempt, wait_exponential
+from sqlalchemy import insert
 from src.models import CustomerInteraction
-from src.utils.database import get_db_session
+from src.utils.database import get_scoped_session, remove_scoped_session
 from src.agents.decision_agent import DecisionAgent
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Default cap on simultaneous calls in a campaign, to stay within OpenAI rate limits
+MAX_CONCURRENT_CALLS = 20
+
+# Summaries for non-realtime calls are queued here and sent through the Batch API
+SUMMARY_BATCH_FILE = os.getenv("SUMMARY_BATCH_FILE", "data/summary_batch.jsonl")
+SUMMARY_SUBMITTED_FILE = SUMMARY_BATCH_FILE + ".submitted"
+BATCH_POLL_INTERVAL = 30
+BATCH_TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+# Customer utterances are classified together, up to this many per request
+INTENT_BATCH_SIZE = 8
+INTENT_BATCH_TIMEOUT = 0.05  # seconds to wait for more utterances
+
+# Fixed instruction blocks sent as system messages, so the user message
+# carries only the per-call data and the shared prefix can be cached
+_SUMMARY_SYSTEM_PROMPT = (
+    "Summarize the EMI collection call transcript in 2-3 sentences. "
+    "Focus on the outcome and the customer's response."
+)
+_INTENT_SYSTEM_PROMPT = (
+    "Classify each numbered customer reply from an EMI collection call. "
+    "Intents: payment_agreement (wants to pay now), payment_delay (asks for more "
+    "time), payment_refusal (refuses to pay), request_info (asks for more "
+    "information), unclear. "
+    'Return JSON {"results": [{"id", "intent", "confidence" (0-1), "next_state"}]}.'
+)
+
+# Intent results are reused for repeated utterances
+INTENT_CACHE_SIZE = 10_000
+
+# Completed campaign interactions are written in bulk once this many are queued
+INTERACTION_FLUSH_SIZE = 100
+
+UNCLEAR_INTENT = {"intent": "unclear", "confidence": 0.0, "next_state": "clarification"}
+
+
+# OpenAI client shared by the agents, and the event loop it was created on
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+async def _openai_client() -> openai.AsyncOpenAI:
+    """
+    Shared OpenAI client so keep-alive connections are reused across agents.
+    Requests are multiplexed over HTTP/2; the client is safe to use from
+    concurrent initiate_call coroutines. httpx connections belong to the
+    event loop that opened them, so there is one client per loop: callers
+    close it with close_openai_client() before their loop ends, and a client
+    left over from another loop is closed here before it is replaced.
+    Retries are left to _chat_completion, so the SDK's own are disabled.
+    """
+    global _client_loop, _client
+
+    loop = asyncio.get_running_loop()
+    if _client is not None and _client_loop is not loop:
+        await close_openai_client()
+    if _client is None:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        )
+        _client = openai.AsyncOpenAI(
+            max_retries=0, http_client=httpx.AsyncClient(transport=transport)
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_openai_client():
+    """
+    Close the shared OpenAI client and its connection pool. The next
+    request opens a new client.
+    """
+    global _client_loop, _client
+
+    client, _client, _client_loop = _client, None, None
+    if client is not None:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing OpenAI client: {str(e)}")
+
+
+def run_with_openai_client(coroutine):
+    """
+    asyncio.run() for code that uses the shared OpenAI client, closing the
+    client before the event loop ends so its connections are not leaked.
+    """
+
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await close_openai_client()
+
+    return asyncio.run(run())
+
+
+@lru_cache(maxsize=1)
+def _decision_agent() -> DecisionAgent:
+    """
+    Shared DecisionAgent; it holds only static decision rules.
+    """
+    return DecisionAgent()
+
+
+def _freeze(tables: Dict[str, Dict[str, str]]) -> Mapping[str, Mapping[str, str]]:
+    """
+    Wrap a two-level table in read-only mapping proxies.
+    """
+    return MappingProxyType(
+        {key: MappingProxyType(table) for key, table in tables.items()}
+    )
+
+
+# Conversation templates by language
+_TEMPLATES: Final[Mapping[str, Mapping[str, str]]] = _freeze(
+    {
+        "en": {
+            "greeting": "Hello {name}, this is an automated call from your financial institution regarding your EMI payment.",
+            "emi_reminder": "Your EMI of ₹{amount} is due on {date}. Would you like to make the payment now?",
+            "payment_options": "You can pay through our secure payment link, UPI, or net banking. Which option would you prefer?",
+            "closing": "Thank you for your time. Have a great day!",
+        },
+        "hi": {
+            "greeting": "नमस्ते {name}, यह आपकी वित्तीय संस्था से EMI भुगतान के संबंध में एक स्वचालित कॉल है।",
+            "emi_reminder": "आपकी ₹{amount} की EMI {date} को देय है। क्या आप अभी भुगतान करना चाहेंगे?",
+            "payment_options": "आप हमारे सुरक्षित भुगतान लिंक, UPI, या नेट बैंकिंग के माध्यम से भुगतान कर सकते हैं। आप कौन सा विकल्प पसंद करेंगे?",
+            "closing": "आपके समय के लिए धन्यवाद। आपका दिन शुभ हो!",
+        },
+    }
+)
+
+
+def _compile_template(template: str) -> Callable[..., str]:
+    """
+    Compile a str.format template into an f-string function, so the format
+    string is parsed once here instead of on every render. Templates with
+    no fields, or with fields an f-string cannot express, keep str.format,
+    which is already the faster of the two for constant text.
+    """
+    parts = []
+    fields = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if not field.isidentifier() or keyword.iskeyword(field) or "{" in spec:
+            return template.format
+        if field not in fields:
+            fields.append(field)
+        conversion = f"!{conversion}" if conversion else ""
+        spec = f":{spec}" if spec else ""
+        parts.append(f"{{{field}{conversion}{spec}}}")
+
+    if not fields:
+        return template.format
+
+    source = f"lambda *, {', '.join(fields)}, **_: f{''.join(parts)!r}"
+    try:
+        return eval(compile(source, "<template>", "eval"), {})
+    except SyntaxError:
+        return template.format
+
+
+# Compiled renderers for each template
+_COMPILED_TEMPLATES: Final[Mapping[str, Mapping[str, Callable[..., str]]]] = (
+    MappingProxyType(
+        {
+            language: MappingProxyType(
+                {key: _compile_template(text) for key, text in templates.items()}
+            )
+            for language, templates in _TEMPLATES.items()
+        }
+    )
+)
+_EN_COMPILED_TEMPLATES: Final = _COMPILED_TEMPLATES["en"]
+
+# Conversation states
+_CONVERSATION_STATES: Final[Mapping[str, str]] = MappingProxyType(
+    {
+        "GREETING": "greeting",
+        "EMI_DISCUSSION": "emi_discussion",
+        "PAYMENT_INQUIRY": "payment_inquiry",
+        "PAYMENT_PROCESSING": "payment_processing",
+        "CLOSING": "closing",
+    }
+)
+
+# Bot replies by language and detected intent
+_BOT_RESPONSES: Final[Mapping[str, Mapping[str, str]]] = _freeze(
+    {
+        "en": {
+            "payment_agreement": "Great! I'll send you a secure payment link shortly. You can complete the payment using your preferred method.",
+            "payment_delay": "I understand you need more time. Let's find a suitable date for your payment. When would work best for you?",
+            "payment_refusal": "I understand your concerns. Let me connect you with our customer service team to discuss available options.",
+            "unclear": "I'm sorry, I didn't quite understand. Could you please clarify your response?",
+            "request_info": "I'd be happy to provide more information. What specific details would you like to know?",
+        },
+        "hi": {
+            "payment_agreement": "बहुत अच्छा! मैं आपको जल्द ही एक सुरक्षित भुगतान लिंक भेजूंगा।",
+            "payment_delay": "मैं समझ सकता हूं कि आपको अधिक समय चाहिए। आइए एक उपयुक्त तारीख तय करते हैं।",
+            "payment_refusal": "मैं आपकी चिंताओं को समझ सकता हूं। मुझे आपको हमारी ग्राहक सेवा टीम से जोड़ने दें।",
+            "unclear": "खुशी, मैं ठीक से नहीं समझ पाया। कृपया अपना उत्तर स्पष्ट कर सकते हैं?",
+            "request_info": "मुझे अधिक जानकारी प्रदान करने में खुशी होगी। आप किस विशिष्ट विवरण के बारे में जानना चाहेंगे?",
+        },
+    }
+)
+
+# Reply tables that fall back to English for intents missing in a language
+_RESPONSE_LOOKUP: Final[Mapping[str, Mapping[str, str]]] = MappingProxyType(
+    {
+        language: ChainMap(table, _BOT_RESPONSES["en"])
+        for language, table in _BOT_RESPONSES.items()
+    }
+)
+_EN_RESPONSE_LOOKUP: Final = _RESPONSE_LOOKUP["en"]
+_UNCLEAR_RESPONSE: Final[str] = _BOT_RESPONSES["en"]["unclear"]
+
+# Simulated call scripts by customer response type. Each step is
+# (speaker, template key or literal text).
+_SCRIPTS: Final[Mapping[str, Tuple[Tuple[str, str], ...]]] = MappingProxyType(
+    {
+        "cooperative": (
+            ("Bot", "greeting"),
+            ("Bot", "emi_reminder"),
+            ("Customer", "Yes, I would like to make the payment now."),
+            ("Bot", "payment_options"),
+            ("Customer", "I'll use UPI. Please send me the payment link."),
+            ("Bot", "closing"),
+        ),
+        "hesitant": (
+            ("Bot", "greeting"),
+            ("Bot", "emi_reminder"),
+            (
+                "Customer",
+                "I'm having some financial difficulties. Can I pay in a few days?",
+            ),
+            (
+                "Bot",
+                "I understand your situation. When would be a good time for you to make the payment?",
+            ),
+            ("Customer", "Maybe by the end of this week."),
+            ("Bot", "closing"),
+        ),
+        "unavailable": (
+            ("Bot", "greeting"),
+            ("Bot", "emi_reminder"),
+            ("Customer", "I'm busy right now. Can you call later?"),
+            ("Bot", "Of course. When would be a convenient time to call you back?"),
+            ("Customer", "Tomorrow evening would be better."),
+            ("Bot", "closing"),
+        ),
+        "non_responsive": (
+            ("Bot", "greeting"),
+            ("Bot", "emi_reminder"),
+            ("Customer", "[No clear response or hung up]"),
+            ("Bot", "closing"),
+        ),
+    }
+)
+
+
+def _prepare_script(script: Tuple[Tuple[str, str], ...]) -> Tuple:
+    """
+    Pre-render the literal lines of a script. Template steps become
+    (speaker prefix, template key) pairs rendered per call.
+    """
+    return tuple(
+        (f"{speaker}: ", line) if line in _TEMPLATES["en"] else f"{speaker}: {line}"
+        for speaker, line in script
+    )
+
+
+_PREPARED_SCRIPTS: Final[Mapping[str, Tuple]] = MappingProxyType(
+    {
+        response_type: _prepare_script(script)
+        for response_type, script in _SCRIPTS.items()
+    }
+)
+_EMI_REMINDER_STEP: Final = ("Bot: ", "emi_reminder")
+
+# (outcome, sentiment_score) for each simulated response type
+_SCRIPT_OUTCOMES: Final[Mapping[str, Tuple[str, float]]] = MappingProxyType(
+    {
+        "cooperative": ("payment_requested", 0.8),
+        "hesitant": ("promised_payment", 0.3),
+        "unavailable": ("reschedule_requested", 0.1),
+        "non_responsive": ("no_response", -0.2),
+    }
+)
+
+# Summaries of the scripted conversations, which need no AI summary
+_SUMMARY_BY_OUTCOME: Final[Mapping[str, str]] = MappingProxyType(
+    {
+        "payment_requested": "Customer agreed to pay now and asked for a UPI payment link.",
+        "promised_payment": "Customer cited financial difficulties and promised to pay by the end of the week.",
+        "reschedule_requested": "Customer was busy and asked to be called back tomorrow evening.",
+        "no_response": "Customer did not respond clearly or hung up; no payment commitment was obtained.",
+    }
+)
+
+
+# Customer lines the simulation scripts produce
+_SCRIPTED_CUSTOMER_LINES: Final[frozenset] = frozenset(
+    f"{speaker}: {line}"
+    for script in _SCRIPTS.values()
+    for speaker, line in script
+    if speaker == "Customer"
+)
+
+
+def _canned_summary(conversation_log: str, outcome: str) -> Optional[str]:
+    """
+    Static summary for a scripted conversation, or None when the log holds
+    free-form customer text that needs an AI summary.
+    """
+    scripted = all(
+        line in _SCRIPTED_CUSTOMER_LINES
+        for line in conversation_log.splitlines()
+        if line.startswith("Customer: ")
+    )
+    return _SUMMARY_BY_OUTCOME.get(outcome) if scripted else None
+
+
+def _append_file(source: str, destination: str):
+    """
+    Append one queue file onto another and remove the source.
+    """
+    with open(source, "rb") as src, open(destination, "ab") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
 
 class VoiceBotAgent:
     """
@@ -19,66 +364,197 @@ class VoiceBotAgent:
     """
 
     def __init__(self):
-        self.openai_client = openai.OpenAI()
         self.twilio_client = None  # Will initialize when needed
-        self.decision_agent = DecisionAgent()
-
-        # Conversation templates by language
-        self.conversation_templates = {
-            "en": {
-                "greeting": "Hello {name}, this is an automated call from your financial institution regarding your EMI payment.",
-                "emi_reminder": "Your EMI of ₹{amount} is due on {date}. Would you like to make the payment now?",
-                "payment_options": "You can pay through our secure payment link, UPI, or net banking. Which option would you prefer?",
-                "closing": "Thank you for your time. Have a great day!",
-            },
-            "hi": {
-                "greeting": "नमस्ते {name}, यह आपकी वित्तीय संस्था से EMI भुगतान के संबंध में एक स्वचालित कॉल है।",
-                "emi_reminder": "आपकी ₹{amount} की EMI {date} को देय है। क्या आप अभी भुगतान करना चाहेंगे?",
-                "payment_options": "आप हमारे सुरक्षित भुगतान लिंक, UPI, या नेट बैंकिंग के माध्यम से भुगतान कर सकते हैं। आप कौन सा विकल्प पसंद करेंगे?",
-                "closing": "आपके समय के लिए धन्यवाद। आपका दिन शुभ हो!",
-            },
-        }
+        self.decision_agent = _decision_agent()
 
-        # Conversation states
-        self.conversation_states = {
-            "GREETING": "greeting",
-            "EMI_DISCUSSION": "emi_discussion",
-            "PAYMENT_INQUIRY": "payment_inquiry",
-            "PAYMENT_PROCESSING": "payment_processing",
-            "CLOSING": "closing",
-        }
+        # Pending (call_id, customer_input, future) intent classifications
+        self._intent_queue: Deque[Tuple[str, str, asyncio.Future]] = deque()
+        self._intent_flush_task: Optional[asyncio.Task] = None
+        self._intent_requests_in_flight = 0
+        self._intent_cache: LRUCache = LRUCache(maxsize=INTENT_CACHE_SIZE)
+
+        # Pending CustomerInteraction update mappings for bulk write
+        self._interaction_updates: Deque[Dict] = deque()
+
+    async def run_campaign(
+        self,
+        calls: List[Tuple[Dict, Dict]],
+        max_concurrency: int = MAX_CONCURRENT_CALLS,
+        realtime: bool = False,
+    ) -> List[Dict]:
+        """
+        Run many calls concurrently.
+        `calls` is a list of (customer_context, emi_info) pairs; results are
+        returned in the same order. Unless `realtime` is set, summaries are
+        queued for flush_summary_batch instead of generated inline.
+        """
+        call_ids = [str(uuid.uuid4()) for _ in calls]
+
+        try:
+            # Create all interaction records up front in one multi-row INSERT
+            interaction_ids = await asyncio.to_thread(
+                self._create_interaction_records,
+                [
+                    (customer_context["customer_id"], call_id)
+                    for (customer_context, _), call_id in zip(calls, call_ids)
+                ],
+                "voice_call",
+            )
+        except Exception as e:
+            logger.error(f"Error creating campaign interaction records: {str(e)}")
+            return [
+                {"call_id": call_id, "status": "failed", "error": str(e)}
+                for call_id in call_ids
+            ]
+
+        # Classify every customer's likely response in one pass
+        response_types = self._determine_customer_response_types(
+            [customer_context.get("risk_score", 50) for customer_context, _ in calls],
+            [
+                customer_context.get("payment_history", {}).get(
+                    "payment_pattern", "new"
+                )
+                for customer_context, _ in calls
+            ],
+        ).tolist()
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(
+            customer_context: Dict,
+            emi_info: Dict,
+            call_id: str,
+            interaction_id: int,
+            response_type: str,
+        ) -> Dict:
+            async with semaphore:
+                return await self.initiate_call(
+                    customer_context,
+                    emi_info,
+                    realtime=realtime,
+                    call_id=call_id,
+                    interaction_id=interaction_id,
+                    response_type=response_type,
+                )
 
-    def initiate_call(self, customer_context: Dict, emi_info: Dict) -> Dict:
+        results = await asyncio.gather(
+            *[
+                run_one(*call, call_id, interaction_id, response_type)
+                for call, call_id, interaction_id, response_type in zip(
+                    calls, call_ids, interaction_ids, response_types
+                )
+            ]
+        )
+        await self.flush_interaction_updates()
+        return results
+
+    async def initiate_call(
+        self,
+        customer_context: Dict,
+        emi_info: Dict,
+        realtime: bool = True,
+        call_id: Optional[str] = None,
+        interaction_id: Optional[int] = None,
+        response_type: Optional[str] = None,
+    ) -> Dict:
         """
         Initiate a voice call to the customer.
         For demo purposes, this will simulate the call process.
+        Campaigns pass the call_id and interaction_id of a record they
+        already created, and the customer's precomputed response type.
         """
-        call_id = str(uuid.uuid4())
+        call_id = call_id or str(uuid.uuid4())
 
         try:
             # Create interaction record
-            interaction = self._create_interaction_record(
-                customer_context["customer_id"], call_id, "voice_call"
-            )
+            if interaction_id is None:
+                interaction = await asyncio.to_thread(
+                    self._create_interaction_record,
+                    customer_context["customer_id"],
+                    call_id,
+                    "voice_call",
+                )
+                interaction_id = interaction.id
 
             # For demo, simulate the conversation instead of actual call
-            conversation_result = self._simulate_conversation(
-                customer_context, emi_info
+            conversation_result = await self._simulate_conversation(
+                customer_context, emi_info, response_type
             )
 
-            # Update interaction with results
-            self._update_interaction_record(
-                call_id,
-                conversation_result["conversation_log"],
-                conversation_result["outcome"],
-                conversation_result["sentiment_score"],
-                conversation_result["call_duration"],
+            # Update interaction with results; campaign calls are written in bulk
+            # and their summaries deferred to the Batch API. Scripted
+            # conversations get a canned summary and skip the AI call.
+            summary = _canned_summary(
+                conversation_result["conversation_log"], conversation_result["outcome"]
             )
+            conversation_result["summary"] = summary
+            decision = None
+            if realtime and summary is not None:
+                # Results write and decision are independent
+                _, decision = await asyncio.gather(
+                    asyncio.to_thread(
+                        self._update_interaction_record,
+                        call_id,
+                        conversation_result["conversation_log"],
+                        conversation_result["outcome"],
+                        conversation_result["sentiment_score"],
+                        conversation_result["call_duration"],
+                        summary,
+                    ),
+                    self.decision_agent.make_decision_async(
+                        conversation_result, customer_context
+                    ),
+                )
+            elif realtime:
+                # Summary stream, results write and decision are independent
+                summary, _, decision = await asyncio.gather(
+                    self._generate_conversation_summary(
+                        conversation_result["conversation_log"], customer_context
+                    ),
+                    asyncio.to_thread(
+                        self._update_interaction_record,
+                        call_id,
+                        conversation_result["conversation_log"],
+                        conversation_result["outcome"],
+                        conversation_result["sentiment_score"],
+                        conversation_result["call_duration"],
+                    ),
+                    self.decision_agent.make_decision_async(
+                        conversation_result, customer_context
+                    ),
+                )
+                conversation_result["summary"] = summary
+                await asyncio.to_thread(
+                    self._update_interaction_record, call_id, summary=summary
+                )
+            else:
+                if summary is None:
+                    await asyncio.to_thread(
+                        self.queue_summary,
+                        call_id,
+                        self._build_summary_prompt(
+                            conversation_result["conversation_log"], customer_context
+                        ),
+                    )
+                self._interaction_updates.append(
+                    {
+                        "id": interaction_id,
+                        "conversation_log": conversation_result["conversation_log"],
+                        "outcome": conversation_result["outcome"],
+                        "sentiment_score": conversation_result["sentiment_score"],
+                        "call_duration": conversation_result["call_duration"],
+                        "summary": summary,
+                        "status": "completed",
+                    }
+                )
+                if len(self._interaction_updates) >= INTERACTION_FLUSH_SIZE:
+                    await self.flush_interaction_updates()
 
             # Make decision based on conversation outcome
-            decision = self.decision_agent.make_decision(
-                conversation_result, customer_context
-            )
+            if decision is None:
+                decision = self.decision_agent.make_decision(
+                    conversation_result, customer_context
+                )
 
             return {
                 "call_id": call_id,
@@ -92,88 +568,50 @@ class VoiceBotAgent:
             logger.error(f"Error in call initiation: {str(e)}")
             return {"call_id": call_id, "status": "failed", "error": str(e)}
 
-    def _simulate_conversation(self, customer_context: Dict, emi_info: Dict) -> Dict:
+    async def _simulate_conversation(
+        self,
+        customer_context: Dict,
+        emi_info: Dict,
+        response_type: Optional[str] = None,
+    ) -> Dict:
         """
         Simulate a conversation with the customer.
         In production, this would be replaced with actual voice interaction.
         """
         language = customer_context.get("language_preference", "en")
-        templates = self.conversation_templates.get(
-            language, self.conversation_templates["en"]
-        )
-
-        # Build conversation context for AI
-        context_prompt = self._build_conversation_prompt(
-            customer_context, emi_info, language
-        )
+        templates = _COMPILED_TEMPLATES.get(language, _EN_COMPILED_TEMPLATES)
 
         # Simulate customer responses based on their profile
-        customer_response_type = self._determine_customer_response_type(
-            customer_context
+        customer_response_type = (
+            response_type or self._determine_customer_response_type(customer_context)
         )
 
-        conversation_log = []
-        conversation_log.append(
-            f"Bot: {templates['greeting'].format(name=customer_context['name'])}"
-        )
-
-        # EMI reminder
-        if emi_info.get("emi_amount"):
-            emi_message = templates["emi_reminder"].format(
-                amount=emi_info["emi_amount"], date=emi_info.get("due_date", "soon")
-            )
-            conversation_log.append(f"Bot: {emi_message}")
-
         # Simulate customer response
-        if customer_response_type == "cooperative":
-            conversation_log.append(
-                "Customer: Yes, I would like to make the payment now."
-            )
-            conversation_log.append(f"Bot: {templates['payment_options']}")
-            conversation_log.append(
-                "Customer: I'll use UPI. Please send me the payment link."
-            )
-            outcome = "payment_requested"
-            sentiment_score = 0.8
-
-        elif customer_response_type == "hesitant":
-            conversation_log.append(
-                "Customer: I'm having some financial difficulties. Can I pay in a few days?"
-            )
-            conversation_log.append(
-                "Bot: I understand your situation. When would be a good time for you to make the payment?"
-            )
-            conversation_log.append("Customer: Maybe by the end of this week.")
-            outcome = "promised_payment"
-            sentiment_score = 0.3
-
-        elif customer_response_type == "unavailable":
-            conversation_log.append("Customer: I'm busy right now. Can you call later?")
-            conversation_log.append(
-                "Bot: Of course. When would be a convenient time to call you back?"
-            )
-            conversation_log.append("Customer: Tomorrow evening would be better.")
-            outcome = "reschedule_requested"
-            sentiment_score = 0.1
-
-        else:  # non_responsive
-            conversation_log.append("Customer: [No clear response or hung up]")
-            outcome = "no_response"
-            sentiment_score = -0.2
+        script = _PREPARED_SCRIPTS.get(
+            customer_response_type, _PREPARED_SCRIPTS["non_responsive"]
+        )
+        outcome, sentiment_score = _SCRIPT_OUTCOMES.get(
+            customer_response_type, _SCRIPT_OUTCOMES["non_responsive"]
+        )
 
-        conversation_log.append(f"Bot: {templates['closing']}")
+        values = {
+            "name": customer_context["name"],
+            "amount": emi_info.get("emi_amount"),
+            "date": emi_info.get("due_date", "soon"),
+        }
+        has_emi_amount = bool(emi_info.get("emi_amount"))
 
-        # Generate AI-powered conversation summary
-        summary = self._generate_conversation_summary(
-            conversation_log, customer_context
-        )
+        conversation_log = [
+            step if isinstance(step, str) else step[0] + templates[step[1]](**values)
+            for step in script
+            if has_emi_amount or step != _EMI_REMINDER_STEP
+        ]
 
         return {
             "conversation_log": "\n".join(conversation_log),
             "outcome": outcome,
             "sentiment_score": sentiment_score,
             "call_duration": len(conversation_log) * 10,  # Simulate duration
-            "summary": summary,
         }
 
     def _determine_customer_response_type(self, customer_context: Dict) -> str:
@@ -194,47 +632,91 @@ class VoiceBotAgent:
         else:
             return "hesitant"
 
+    def _determine_customer_response_types(
+        self, risk_scores: np.ndarray, payment_patterns: np.ndarray
+    ) -> np.ndarray:
+        """
+        Vectorized _determine_customer_response_type for campaigns.
+        `payment_patterns` holds the pattern strings, one per risk score.
+        """
+        risk_scores = np.asarray(risk_scores, dtype=float)
+        good_payers = np.asarray(payment_patterns) == "good"
+
+        return np.select(
+            [
+                good_payers & (risk_scores < 30),
+                good_payers & (risk_scores < 60),
+                risk_scores > 70,
+            ],
+            ["cooperative", "hesitant", "non_responsive"],
+            default="hesitant",
+        )
+
     def _build_conversation_prompt(
         self, customer_context: Dict, emi_info: Dict, language: str
     ) -> str:
         """
         Build AI prompt for conversation generation.
         """
-        prompt = f"""
-        You are an AI assistant for EMI collection calls. 
-        Customer: {customer_context['name']}
-        Language: {language}
-        Risk Score: {customer_context.get('risk_score', 'unknown')}
-        Payment History: {customer_context.get('payment_history', {}).get('payment_pattern', 'unknown')}
-        
-        Be polite, professional, and helpful. Focus on finding a solution that works for both the customer and the institution.
+        context = {
+            "customer": customer_context["name"],
+            "language": language,
+            "risk_score": customer_context.get("risk_score", "unknown"),
+            "payment_history": customer_context.get("payment_history", {}).get(
+                "payment_pattern", "unknown"
+            ),
+        }
+        return (
+            "You are an AI assistant for EMI collection calls. Be polite, "
+            "professional and helpful, and find a solution that works for both "
+            "the customer and the institution. Context: "
+            + orjson.dumps(context).decode()
+        )
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        reraise=True,
+    )
+    async def _chat_completion(self, **kwargs):
         """
-        return prompt
+        Chat completion with exponential-backoff retry (up to 3 attempts).
+        """
+        client = await _openai_client()
+        return await client.chat.completions.create(**kwargs)
+
+    def _build_summary_prompt(self, conversation: str, customer_context: Dict) -> str:
+        """
+        Build the per-call part of the summary prompt.
+        """
+        return f"Customer: {customer_context['name']}\n{conversation}"
 
-    def _generate_conversation_summary(
-        self, conversation_log: List[str], customer_context: Dict
+    async def _generate_conversation_summary(
+        self, conversation: str, customer_context: Dict
     ) -> str:
         """
         Generate AI-powered summary of the conversation.
+        The response is streamed so tokens are consumed as they arrive.
         """
         try:
-            prompt = f"""
-            Summarize the following EMI collection call conversation in 2-3 sentences:
-            
-            Customer: {customer_context['name']}
-            Conversation:
-            {' '.join(conversation_log)}
-            
-            Focus on the outcome and customer's response.
-            """
-
-            response = self.openai_client.chat.completions.create(
+            prompt = self._build_summary_prompt(conversation, customer_context)
+
+            stream = await self._chat_completion(
                 model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": _SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
                 max_tokens=100,
+                stream=True,
             )
 
-            content = response.choices[0].message.content
+            parts = []
+            async for chunk in stream:
+                if chunk.choices:
+                    parts.append(chunk.choices[0].delta.content or "")
+
+            content = "".join(parts)
             return content.strip() if content else "Conversation completed."
 
         except Exception as e:
@@ -243,68 +725,240 @@ class VoiceBotAgent:
                 "Conversation completed. Customer was contacted regarding EMI payment."
             )
 
+    def queue_summary(self, call_id: str, prompt: str):
+        """
+        Queue a summary request for the next Batch API submission.
+        """
+        request = {
+            "custom_id": call_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "gpt-3.5-turbo",
+                "messages": [
+                    {"role": "system", "content": _SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                "max_tokens": 100,
+            },
+        }
+        os.makedirs(os.path.dirname(SUMMARY_BATCH_FILE) or ".", exist_ok=True)
+        with open(SUMMARY_BATCH_FILE, "a", encoding="utf-8") as f:
+            f.write(orjson.dumps(request).decode() + "\n")
+
+    async def flush_summary_batch(
+        self, poll_interval: float = BATCH_POLL_INTERVAL
+    ) -> Dict:
+        """
+        Submit queued summaries as an OpenAI batch, wait for it to finish
+        and store each summary on its interaction record.
+        """
+        requests = await asyncio.to_thread(self._take_summary_queue)
+        if not requests:
+            return {"status": "empty", "updated": 0}
+
+        submitted = False
+        try:
+            client = await _openai_client()
+            batch_file = await client.files.create(
+                file=(os.path.basename(SUMMARY_BATCH_FILE), requests), purpose="batch"
+            )
+
+            batch = await client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+            submitted = True
+            await asyncio.to_thread(os.remove, SUMMARY_SUBMITTED_FILE)
+
+            while batch.status not in BATCH_TERMINAL_STATES:
+                await asyncio.sleep(poll_interval)
+                batch = await client.batches.retrieve(batch.id)
+
+            if batch.status != "completed" or not batch.output_file_id:
+                logger.error(f"Summary batch {batch.id} ended as {batch.status}")
+                return {"status": batch.status, "batch_id": batch.id, "updated": 0}
+
+            output = await client.files.content(batch.output_file_id)
+
+            updated = 0
+            for line in output.text.splitlines():
+                result = orjson.loads(line)
+                body = (result.get("response") or {}).get("body") or {}
+                choices = body.get("choices") or []
+                if not choices or not choices[0]["message"].get("content"):
+                    continue
+
+                await asyncio.to_thread(
+                    self._update_interaction_record,
+                    result["custom_id"],
+                    summary=choices[0]["message"]["content"].strip(),
+                )
+                updated += 1
+
+            return {"status": "completed", "batch_id": batch.id, "updated": updated}
+
+        except Exception as e:
+            logger.error(f"Error flushing summary batch: {str(e)}")
+            if not submitted:
+                await asyncio.to_thread(self._requeue_summaries)
+            return {"status": "failed", "error": str(e)}
+
+    def _take_summary_queue(self) -> bytes:
+        """
+        Move the summary queue aside so calls made while polling start a new
+        batch, and return its contents. Requests left aside by an interrupted
+        flush are submitted along with them.
+        """
+        if os.path.exists(SUMMARY_BATCH_FILE):
+            if os.path.exists(SUMMARY_SUBMITTED_FILE):
+                _append_file(SUMMARY_BATCH_FILE, SUMMARY_SUBMITTED_FILE)
+            else:
+                os.replace(SUMMARY_BATCH_FILE, SUMMARY_SUBMITTED_FILE)
+
+        if not os.path.exists(SUMMARY_SUBMITTED_FILE):
+            return b""
+        with open(SUMMARY_SUBMITTED_FILE, "rb") as f:
+            return f.read()
+
+    def _requeue_summaries(self):
+        """
+        Return summaries that could not be submitted to the queue.
+        """
+        if os.path.exists(SUMMARY_SUBMITTED_FILE):
+            _append_file(SUMMARY_SUBMITTED_FILE, SUMMARY_BATCH_FILE)
+
     def _create_interaction_record(
         self, customer_id: int, call_id: str, interaction_type: str
     ) -> CustomerInteraction:
         """
         Create a new customer interaction record.
         """
-        db = get_db_session()
+        db = get_scoped_session()
         try:
             interaction = CustomerInteraction(
                 customer_id=customer_id,
                 call_id=call_id,
                 interaction_type=interaction_type,
                 status="in_progress",
-                created_at=datetime.utcnow(),
             )
             db.add(interaction)
             db.commit()
-            db.refresh(interaction)
             return interaction
+        except Exception:
+            db.rollback()
+            raise
         finally:
-            db.close()
+            remove_scoped_session()
+
+    def _create_interaction_records(
+        self, records: List[Tuple[int, str]], interaction_type: str
+    ) -> List[int]:
+        """
+        Create interaction records for (customer_id, call_id) pairs in one
+        multi-row INSERT. Returns the new ids in the same order.
+        """
+        if not records:
+            return []
+
+        db = get_scoped_session()
+        try:
+            interaction_ids = (
+                db.execute(
+                    insert(CustomerInteraction).returning(
+                        CustomerInteraction.id, sort_by_parameter_order=True
+                    ),
+                    [
+                        {
+                            "customer_id": customer_id,
+                            "call_id": call_id,
+                            "interaction_type": interaction_type,
+                            "status": "in_progress",
+                        }
+                        for customer_id, call_id in records
+                    ],
+                )
+                .scalars()
+                .all()
+            )
+            db.commit()
+            return list(interaction_ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            remove_scoped_session()
 
     def _update_interaction_record(
         self,
         call_id: str,
-        conversation_log: str,
-        outcome: str,
-        sentiment_score: float,
-        call_duration: int,
+        conversation_log: Optional[str] = None,
+        outcome: Optional[str] = None,
+        sentiment_score: Optional[float] = None,
+        call_duration: Optional[int] = None,
+        summary: Optional[str] = None,
     ):
         """
         Update interaction record with conversation results.
+        Only the fields that are given are written.
         """
-        db = get_db_session()
+        values = {
+            "conversation_log": conversation_log,
+            "outcome": outcome,
+            "sentiment_score": sentiment_score,
+            "call_duration": call_duration,
+            "summary": summary,
+        }
+        values = {key: value for key, value in values.items() if value is not None}
+        if conversation_log is not None:
+            values["status"] = "completed"
+
+        db = get_scoped_session()
         try:
-            interaction = (
+            updated = (
                 db.query(CustomerInteraction)
-                .filter(CustomerInteraction.call_id == call_id)
-                .first()
+                .filter_by(call_id=call_id)
+                .update(values, synchronize_session=False)
             )
+            db.commit()
 
-            if interaction:
-                # Update using SQLAlchemy's update method
-                db.query(CustomerInteraction).filter(
-                    CustomerInteraction.call_id == call_id
-                ).update(
-                    {
-                        "conversation_log": conversation_log,
-                        "outcome": outcome,
-                        "sentiment_score": sentiment_score,
-                        "call_duration": call_duration,
-                        "status": "completed",
-                    }
-                )
-                db.commit()
+            if updated == 0:
+                logger.warning(f"No interaction record found for call {call_id}")
 
         except Exception as e:
+            db.rollback()
             logger.error(f"Error updating interaction record: {str(e)}")
         finally:
-            db.close()
+            remove_scoped_session()
+
+    async def flush_interaction_updates(self):
+        """
+        Write all queued interaction updates in one bulk UPDATE.
+        """
+        rows = [
+            self._interaction_updates.popleft()
+            for _ in range(len(self._interaction_updates))
+        ]
+        if rows:
+            await asyncio.to_thread(self._bulk_update_interactions, rows)
+
+    def _bulk_update_interactions(self, rows: List[Dict]):
+        """
+        Apply a list of CustomerInteraction update mappings keyed by id.
+        """
+        db = get_scoped_session()
+        try:
+            db.bulk_update_mappings(CustomerInteraction, rows)
+            db.commit()
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error bulk updating interaction records: {str(e)}")
+        finally:
+            remove_scoped_session()
 
-    def process_customer_response(
+    async def process_customer_response(
         self, call_id: str, customer_input: str, context: Dict
     ) -> Dict:
         """
@@ -312,7 +966,9 @@ class VoiceBotAgent:
         """
         try:
             # Use AI to understand customer intent
-            intent_analysis = self._analyze_customer_intent(customer_input, context)
+            intent_analysis = await self._analyze_customer_intent(
+                customer_input, context, call_id
+            )
 
             # Generate appropriate response
             bot_response = self._generate_bot_response(intent_analysis, context)
@@ -333,50 +989,118 @@ class VoiceBotAgent:
                 "next_state": "clarification",
             }
 
-    def _analyze_customer_intent(self, customer_input: str, context: Dict) -> Dict:
+    async def _analyze_customer_intent(
+        self, customer_input: str, context: Dict, call_id: str = ""
+    ) -> Dict:
         """
         Analyze customer's intent using AI.
+        While another classification is in flight, utterances are buffered
+        and classified in bulk; this waits for the batch containing
+        `customer_input` to be flushed. A lone utterance is sent at once.
+        Results for previously seen utterances are served from an LRU cache.
+        """
+        cache_key = " ".join(customer_input.lower().split())
+        cached = self._intent_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+        future = asyncio.get_running_loop().create_future()
+        self._intent_queue.append((call_id, customer_input, future))
+
+        idle = self._intent_requests_in_flight == 0 and self._intent_flush_task is None
+        if idle or len(self._intent_queue) >= INTENT_BATCH_SIZE:
+            await self._flush_intent_queue()
+        elif self._intent_flush_task is None:
+            self._intent_flush_task = asyncio.create_task(
+                self._flush_intent_queue_after(INTENT_BATCH_TIMEOUT)
+            )
+
+        result = await future
+        if result["intent"] != "unclear":
+            self._intent_cache[cache_key] = dict(result)
+        return result
+
+    async def _flush_intent_queue_after(self, delay: float):
+        """
+        Flush the intent queue once `delay` seconds have passed.
+        """
+        await asyncio.sleep(delay)
+        self._intent_flush_task = None
+        await self._flush_intent_queue()
+
+    async def _flush_intent_queue(self):
         """
+        Classify up to INTENT_BATCH_SIZE queued utterances in one request.
+        """
+        batch = [
+            self._intent_queue.popleft()
+            for _ in range(min(len(self._intent_queue), INTENT_BATCH_SIZE))
+        ]
+        if not batch:
+            return
+
+        self._intent_requests_in_flight += 1
         try:
-            prompt = f"""
-            Analyze the customer's intent from their response in an EMI collection call:
-            
-            Customer said: "{customer_input}"
-            
-            Possible intents:
-            - payment_agreement: Customer wants to pay now
-            - payment_delay: Customer asks for more time
-            - payment_refusal: Customer refuses to pay
-            - unclear: Response is not clear
-            - request_info: Customer asks for more information
-            
-            Respond in JSON format with intent, confidence (0-1), and suggested next_state.
-            """
-
-            response = self.openai_client.chat.completions.create(
+            results = await self._analyze_customer_intents_bulk(
+                [(call_id, customer_input) for call_id, customer_input, _ in batch]
+            )
+        finally:
+            self._intent_requests_in_flight -= 1
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _analyze_customer_intents_bulk(
+        self, inputs: List[Tuple[str, str]]
+    ) -> List[Dict]:
+        """
+        Analyze several customer responses in a single AI request.
+        `inputs` is a list of (call_id, customer_input) pairs; results are
+        returned in the same order.
+        """
+        try:
+            utterances = "\n".join(
+                f"{number}. {orjson.dumps(customer_input).decode()}"
+                for number, (_, customer_input) in enumerate(inputs, start=1)
+            )
+
+            response = await self._chat_completion(
                 model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=100,
+                messages=[
+                    {"role": "system", "content": _INTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": utterances},
+                ],
+                max_tokens=60 * len(inputs) + 40,
+                response_format={"type": "json_object"},
             )
 
             content = response.choices[0].message.content
-            if content:
-                result = json.loads(content)
-            else:
-                result = {
-                    "intent": "unclear",
-                    "confidence": 0.0,
-                    "next_state": "clarification",
-                }
-            return result
+            parsed = orjson.loads(content).get("results", []) if content else []
+
+            by_number = {}
+            for item in parsed:
+                if isinstance(item, dict) and "id" in item:
+                    by_number[int(item["id"])] = item
+
+            results = []
+            for number in range(1, len(inputs) + 1):
+                item = by_number.get(number)
+                if item is None:
+                    results.append(dict(UNCLEAR_INTENT))
+                    continue
+                results.append(
+                    {
+                        "intent": item.get("intent", "unclear"),
+                        "confidence": item.get("confidence", 0.0),
+                        "next_state": item.get("next_state", "clarification"),
+                    }
+                )
+            return results
 
         except Exception as e:
-            logger.error(f"Error analyzing intent: {str(e)}")
-            return {
-                "intent": "unclear",
-                "confidence": 0.0,
-                "next_state": "clarification",
-            }
+            logger.error(f"Error analyzing intents: {str(e)}")
+            return [dict(UNCLEAR_INTENT) for _ in inputs]
 
     def _generate_bot_response(self, intent_analysis: Dict, context: Dict) -> str:
         """
@@ -385,23 +1109,6 @@ class VoiceBotAgent:
         intent = intent_analysis["intent"]
         language = context.get("language_preference", "en")
 
-        responses = {
-            "en": {
-                "payment_agreement": "Great! I'll send you a secure payment link shortly. You can complete the payment using your preferred method.",
-                "payment_delay": "I understand you need more time. Let's find a suitable date for your payment. When would work best for you?",
-                "payment_refusal": "I understand your concerns. Let me connect you with our customer service team to discuss available options.",
-                "unclear": "I'm sorry, I didn't quite understand. Could you please clarify your response?",
-                "request_info": "I'd be happy to provide more information. What specific details would you like to know?",
-            },
-            "hi": {
-                "payment_agreement": "बहुत अच्छा! मैं आपको जल्द ही एक सुरक्षित भुगतान लिंक भेजूंगा।",
-                "payment_delay": "मैं समझ सकता हूं कि आपको अधिक समय चाहिए। आइए एक उपयुक्त तारीख तय करते हैं।",
-                "payment_refusal": "मैं आपकी चिंताओं को समझ सकता हूं। मुझे आपको हमारी ग्राहक सेवा टीम से जोड़ने दें।",
-                "unclear": "खुशी, मैं ठीक से नहीं समझ पाया। कृपया अपना उत्तर स्पष्ट कर सकते हैं?",
-                "request_info": "मुझे अधिक जानकारी प्रदान करने में खुशी होगी। आप किस विशिष्ट विवरण के बारे में जानना चाहेंगे?",
-            },
-        }
-
-        return responses.get(language, responses["en"]).get(
-            intent, responses["en"]["unclear"]
+        return _RESPONSE_LOOKUP.get(language, _EN_RESPONSE_LOOKUP).get(
+            intent, _UNCLEAR_RESPONSE
         )
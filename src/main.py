@@ -1,12 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import logging
+import orjson
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
 from typing import List, Optional
 import uvicorn
 from datetime import datetime
 
-from src.utils.database import get_database, create_tables
+from config.settings import settings
+from src.utils.database import get_async_db, create_tables
 from src.models import (
+    Customer,
+    Loan,
     CustomerCreate,
     CustomerResponse,
     LoanCreate,
@@ -18,102 +29,157 @@ from src.models import (
 )
 from src.agents.trigger_agent import TriggerAgent
 from src.agents.context_agent import ContextAgent
-from src.agents.voicebot_agent import VoiceBotAgent
+from src.agents.voicebot_agent import VoiceBotAgent, close_openai_client
 from src.agents.decision_agent import DecisionAgent
 from src.agents.payment_agent import PaymentAgent
 from src.agents.logging_learning_agent import LoggingLearningAgent
 
+logger = logging.getLogger(__name__)
+
+# How often the cached customer segmentation is recomputed
+SEGMENT_REFRESH_INTERVAL = 600  # seconds
+
+
+async def refresh_customer_segments(app: FastAPI):
+    """
+    Periodically recompute stored risk scores and customer segments into
+    app.state. Runs in a worker thread with its own context agent so the
+    O(N) scan neither blocks the event loop nor shares the request-path cache.
+    """
+    segment_agent = ContextAgent()
+    while True:
+        try:
+            await asyncio.to_thread(segment_agent.refresh_risk_scores)
+            app.state.customer_segments = await asyncio.to_thread(
+                segment_agent.get_customer_segments
+            )
+        except Exception as e:
+            logger.error(f"Error refreshing customer segments: {str(e)}")
+        await asyncio.sleep(SEGMENT_REFRESH_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database and agents on startup, release them on shutdown"""
+    create_tables()
+
+    # One shared set of agents per worker; the trigger agent reuses the
+    # context and voicebot agents so they share caches and connections
+    context_agent = ContextAgent()
+    voicebot_agent = VoiceBotAgent()
+    app.state.agents = SimpleNamespace(
+        trigger=TriggerAgent(context_agent, voicebot_agent),
+        context=context_agent,
+        voicebot=voicebot_agent,
+        decision=DecisionAgent(),
+        payment=PaymentAgent(context_agent),
+        logging=LoggingLearningAgent(),
+    )
+    app.state.agents.logging.log_system_event(
+        {
+            "event": "system_startup",
+            "component": "fastapi_app",
+            "severity": "info",
+            "message": "EMI VoiceBot system started successfully",
+        }
+    )
+
+    app.state.customer_segments = None
+    segment_refresher = asyncio.create_task(refresh_customer_segments(app))
+
+    yield
+
+    segment_refresher.cancel()
+    await close_openai_client()
+
+
+def get_agents(request: Request) -> SimpleNamespace:
+    """Agents created for this worker by the lifespan handler"""
+    return request.app.state.agents
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="EMI VoiceBot System",
     description="Agentic VoiceBots for EMI Collections/Payments",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[settings.FRONTEND_URL],
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
-# Initialize agents
-trigger_agent = TriggerAgent()
-context_agent = ContextAgent()
-voicebot_agent = VoiceBotAgent()
-decision_agent = DecisionAgent()
-payment_agent = PaymentAgent()
-logging_agent = LoggingLearningAgent()
+# Compress larger JSON payloads such as analytics and demo workflow results
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and system on startup"""
-    create_tables()
-    logging_agent.log_system_event(
+@app.get("/")
+async def root():
+    return ORJSONResponse(
         {
-            "event": "system_startup",
-            "component": "fastapi_app",
-            "severity": "info",
-            "message": "EMI VoiceBot system started successfully",
+            "message": "EMI VoiceBot System API",
+            "version": "1.0.0",
+            "status": "running",
+            "timestamp": datetime.now().isoformat(),
         }
     )
 
 
-@app.get("/")
-async def root():
-    return {
-        "message": "EMI VoiceBot System API",
-        "version": "1.0.0",
-        "status": "running",
-        "timestamp": datetime.now().isoformat(),
-    }
-
-
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "services": {"database": "connected", "agents": "initialized"},
-    }
+    return ORJSONResponse(
+        {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "services": {"database": "connected", "agents": "initialized"},
+        }
+    )
 
 
 # Customer Management Endpoints
 @app.post("/customers", response_model=CustomerResponse)
 async def create_customer(
-    customer: CustomerCreate, db: Session = Depends(get_database)
+    customer: CustomerCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    agents: SimpleNamespace = Depends(get_agents),
 ):
     """Create a new customer"""
-    from src.models import Customer
-
-    db_customer = Customer(**customer.dict())
-    db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    result = await db.execute(
+        insert(Customer).values(**customer.model_dump()).returning(Customer)
+    )
+    db_customer = result.scalar_one()
+    await db.commit()
+    await asyncio.to_thread(agents.context.refresh_risk_score, db_customer.id)
 
-    logging_agent.log_system_event(
+    background_tasks.add_task(
+        agents.logging.log_system_event,
         {
             "event": "customer_created",
             "component": "api",
             "severity": "info",
             "message": f"New customer created: {db_customer.name}",
             "metadata": {"customer_id": db_customer.id},
-        }
+        },
     )
 
     return db_customer
 
 
 @app.get("/customers/{customer_id}", response_model=CustomerResponse)
-async def get_customer(customer_id: int, db: Session = Depends(get_database)):
+async def get_customer(customer_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get customer by ID"""
-    from src.models import Customer
-
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    result = await db.execute(select(Customer).where(Customer.id == customer_id))
+    customer = result.scalar_one_or_none()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
 
@@ -121,35 +187,38 @@ async def get_customer(customer_id: int, db: Session = Depends(get_database)):
 
 
 @app.get("/customers/{customer_id}/context")
-async def get_customer_context(customer_id: int):
+async def get_customer_context(
+    customer_id: int, agents: SimpleNamespace = Depends(get_agents)
+):
     """Get comprehensive customer context"""
     try:
-        context = context_agent.get_customer_context(customer_id)
-        return context
+        context = agents.context.get_customer_context(customer_id)
+        return ORJSONResponse(context)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 # Loan Management Endpoints
 @app.post("/loans", response_model=LoanResponse)
-async def create_loan(loan: LoanCreate, db: Session = Depends(get_database)):
+async def create_loan(
+    loan: LoanCreate,
+    db: AsyncSession = Depends(get_async_db),
+    agents: SimpleNamespace = Depends(get_agents),
+):
     """Create a new loan"""
-    from src.models import Loan
-
-    db_loan = Loan(**loan.dict())
-    db.add(db_loan)
-    db.commit()
-    db.refresh(db_loan)
+    result = await db.execute(insert(Loan).values(**loan.model_dump()).returning(Loan))
+    db_loan = result.scalar_one()
+    await db.commit()
+    await asyncio.to_thread(agents.context.refresh_risk_score, db_loan.customer_id)
 
     return db_loan
 
 
 @app.get("/loans/{loan_id}", response_model=LoanResponse)
-async def get_loan(loan_id: int, db: Session = Depends(get_database)):
+async def get_loan(loan_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get loan by ID"""
-    from src.models import Loan
-
-    loan = db.query(Loan).filter(Loan.id == loan_id).first()
+    result = await db.execute(select(Loan).where(Loan.id == loan_id))
+    loan = result.scalar_one_or_none()
     if not loan:
         raise HTTPException(status_code=404, detail="Loan not found")
 
@@ -158,28 +227,34 @@ async def get_loan(loan_id: int, db: Session = Depends(get_database)):
 
 # VoiceBot Interaction Endpoints
 @app.post("/calls/initiate")
-async def initiate_call(customer_id: int, background_tasks: BackgroundTasks):
+async def initiate_call(
+    customer_id: int,
+    background_tasks: BackgroundTasks,
+    agents: SimpleNamespace = Depends(get_agents),
+):
     """Initiate a voice call to customer"""
     try:
         # Get customer context
-        customer_context = context_agent.get_customer_context(customer_id)
+        customer_context = agents.context.get_customer_context(customer_id)
 
         # Initiate call
-        call_result = voicebot_agent.initiate_call(
+        call_result = await agents.voicebot.initiate_call(
             customer_context=customer_context, emi_info={"manual_trigger": True}
         )
+        agents.context.invalidate_customer_context(customer_id)
 
         # Log interaction
-        logging_agent.log_interaction(
+        background_tasks.add_task(
+            agents.logging.log_interaction,
             {
                 "customer_id": customer_id,
                 "call_id": call_result.get("call_id"),
                 "outcome": call_result.get("outcome"),
                 "interaction_type": "voice_call",
-            }
+            },
         )
 
-        return call_result
+        return ORJSONResponse(call_result)
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -189,13 +264,16 @@ async def initiate_call(customer_id: int, background_tasks: BackgroundTasks):
 
 @app.post("/calls/{call_id}/response")
 async def process_customer_response(
-    call_id: str, customer_input: str, customer_id: int
+    call_id: str,
+    customer_input: str,
+    customer_id: int,
+    agents: SimpleNamespace = Depends(get_agents),
 ):
     """Process customer response during call"""
     try:
-        customer_context = context_agent.get_customer_context(customer_id)
+        customer_context = agents.context.get_customer_context(customer_id)
 
-        response = voicebot_agent.process_customer_response(
+        response = await agents.voicebot.process_customer_response(
             call_id=call_id, customer_input=customer_input, context=customer_context
         )
 
@@ -208,51 +286,61 @@ async def process_customer_response(
 # Payment Endpoints
 @app.post("/payments/create-link")
 async def create_payment_link(
-    customer_id: int, loan_id: int, amount: Optional[float] = None
+    customer_id: int,
+    loan_id: int,
+    background_tasks: BackgroundTasks,
+    amount: Optional[float] = None,
+    agents: SimpleNamespace = Depends(get_agents),
 ):
     """Create payment link for customer"""
     try:
-        customer_context = context_agent.get_customer_context(customer_id)
+        customer_context = agents.context.get_customer_context(customer_id)
         loan_info = {"loan_id": loan_id, "emi_amount": amount or 5000}
 
-        payment_link_data = payment_agent.create_payment_link(
+        payment_link_data = agents.payment.create_payment_link(
             customer_context, loan_info, amount
         )
 
-        logging_agent.log_payment_activity(
+        background_tasks.add_task(
+            agents.logging.log_payment_activity,
             {
                 "customer_id": customer_id,
                 "payment_id": payment_link_data.get("payment_id"),
                 "amount": payment_link_data.get("amount"),
                 "status": "link_created",
-            }
+            },
         )
 
-        return payment_link_data
+        return ORJSONResponse(payment_link_data)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/payments/send-link")
-async def send_payment_link(customer_id: int, loan_id: int, channel: str = "sms"):
+async def send_payment_link(
+    customer_id: int,
+    loan_id: int,
+    channel: str = "sms",
+    agents: SimpleNamespace = Depends(get_agents),
+):
     """Send payment link to customer via SMS or WhatsApp"""
     try:
-        customer_context = context_agent.get_customer_context(customer_id)
+        customer_context = agents.context.get_customer_context(customer_id)
         loan_info = {"loan_id": loan_id, "emi_amount": 5000}
 
         # Create payment link
-        payment_link_data = payment_agent.create_payment_link(
+        payment_link_data = agents.payment.create_payment_link(
             customer_context, loan_info
         )
 
         # Send via preferred channel
         if channel == "sms":
-            result = payment_agent.send_payment_link_sms(
+            result = agents.payment.send_payment_link_sms(
                 customer_context, payment_link_data
             )
         elif channel == "whatsapp":
-            result = payment_agent.send_payment_link_whatsapp(
+            result = agents.payment.send_payment_link_whatsapp(
                 customer_context, payment_link_data
             )
         else:
@@ -260,110 +348,161 @@ async def send_payment_link(customer_id: int, loan_id: int, channel: str = "sms"
                 status_code=400, detail="Invalid channel. Use 'sms' or 'whatsapp'"
             )
 
-        return result
+        return ORJSONResponse(result)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/payments/{payment_id}/verify")
-async def verify_payment(payment_id: str, razorpay_payment_id: Optional[str] = None):
+async def verify_payment(
+    payment_id: str,
+    background_tasks: BackgroundTasks,
+    razorpay_payment_id: Optional[str] = None,
+    agents: SimpleNamespace = Depends(get_agents),
+):
     """Verify payment completion"""
     try:
-        result = payment_agent.verify_payment(payment_id, razorpay_payment_id)
+        result = agents.payment.verify_payment(payment_id, razorpay_payment_id)
 
-        logging_agent.log_payment_activity(
+        background_tasks.add_task(
+            agents.logging.log_payment_activity,
             {
                 "payment_id": payment_id,
                 "status": result.get("status"),
                 "amount": result.get("amount"),
-            }
+            },
         )
 
-        return result
+        return ORJSONResponse(result)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/payments/{payment_id}/status")
-async def get_payment_status(payment_id: str):
+async def get_payment_status(
+    payment_id: str, agents: SimpleNamespace = Depends(get_agents)
+):
     """Get payment status"""
     try:
-        return payment_agent.get_payment_status(payment_id)
+        return ORJSONResponse(agents.payment.get_payment_status(payment_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Trigger and Scheduling Endpoints
 @app.post("/triggers/manual")
-async def manual_trigger(customer_id: Optional[int] = None):
+async def manual_trigger(
+    customer_id: Optional[int] = None, agents: SimpleNamespace = Depends(get_agents)
+):
     """Manually trigger EMI calls"""
     try:
-        result = trigger_agent.manual_trigger(customer_id)
+        result = await agents.trigger.manual_trigger(customer_id)
         return {"status": "success", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/triggers/flush-summaries")
+async def flush_summaries(
+    background_tasks: BackgroundTasks, agents: SimpleNamespace = Depends(get_agents)
+):
+    """Submit queued call summaries to the OpenAI Batch API"""
+    background_tasks.add_task(agents.voicebot.flush_summary_batch)
+    return {"status": "scheduled"}
+
+
 @app.get("/triggers/due-emis")
-async def get_due_emis():
-    """Get list of EMIs due for calling"""
+async def get_due_emis(
+    limit: int = 100, offset: int = 0, agents: SimpleNamespace = Depends(get_agents)
+):
+    """Get a page of EMIs due for calling, highest priority first"""
+    try:
+        due_emis, count = await asyncio.gather(
+            asyncio.to_thread(agents.trigger.check_due_emis, limit, offset),
+            asyncio.to_thread(agents.trigger.count_due_emis),
+        )
+        return ORJSONResponse({"due_emis": due_emis, "count": count, "offset": offset})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/triggers/due-emis/stream")
+async def stream_due_emis(agents: SimpleNamespace = Depends(get_agents)):
+    """Stream all EMIs due for calling as NDJSON, highest priority first"""
+    # The generator is synchronous, so Starlette iterates it in a worker thread
+    return StreamingResponse(
+        (orjson.dumps(emi) + b"\n" for emi in agents.trigger.iter_due_emis()),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/triggers/due-emis/count")
+async def get_due_emis_count(agents: SimpleNamespace = Depends(get_agents)):
+    """Get the number of EMIs due for calling"""
     try:
-        due_emis = trigger_agent.check_due_emis()
-        return {"due_emis": due_emis, "count": len(due_emis)}
+        return {"count": await asyncio.to_thread(agents.trigger.count_due_emis)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Analytics and Insights Endpoints
 @app.get("/analytics/interactions")
-async def get_interaction_analytics(days: int = 30):
+async def get_interaction_analytics(
+    days: int = 30, agents: SimpleNamespace = Depends(get_agents)
+):
     """Get interaction analytics"""
     try:
-        analytics = logging_agent.analyze_interaction_patterns(days)
-        return analytics
+        analytics = agents.logging.analyze_interaction_patterns(days)
+        return ORJSONResponse(analytics)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/analytics/payments")
-async def get_payment_analytics(days: int = 30):
+async def get_payment_analytics(
+    days: int = 30, agents: SimpleNamespace = Depends(get_agents)
+):
     """Get payment analytics"""
     try:
-        analytics = payment_agent.get_payment_analytics(days)
-        return analytics
+        analytics = agents.payment.get_payment_analytics(days)
+        return ORJSONResponse(analytics)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/analytics/insights")
-async def get_insights_report(days: int = 30):
+async def get_insights_report(
+    days: int = 30, agents: SimpleNamespace = Depends(get_agents)
+):
     """Get comprehensive insights report"""
     try:
-        report = logging_agent.generate_insights_report(days)
-        return report
+        report = agents.logging.generate_insights_report(days)
+        return ORJSONResponse(report)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ML and Learning Endpoints
 @app.post("/ml/train-predictor")
-async def train_outcome_predictor():
+async def train_outcome_predictor(agents: SimpleNamespace = Depends(get_agents)):
     """Train ML model to predict interaction outcomes"""
     try:
-        result = logging_agent.train_outcome_predictor()
+        result = agents.logging.train_outcome_predictor()
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/ml/predict-outcome")
-async def predict_interaction_outcome(customer_id: int):
+async def predict_interaction_outcome(
+    customer_id: int, agents: SimpleNamespace = Depends(get_agents)
+):
     """Predict interaction outcome for customer"""
     try:
-        customer_context = context_agent.get_customer_context(customer_id)
-        prediction = logging_agent.predict_interaction_outcome(customer_context)
+        customer_context = agents.context.get_customer_context(customer_id)
+        prediction = agents.logging.predict_interaction_outcome(customer_context)
         return prediction
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -389,10 +528,15 @@ async def get_system_status():
 
 
 @app.get("/admin/customer-segments")
-async def get_customer_segments():
-    """Get customer segmentation data"""
+async def get_customer_segments(
+    request: Request, agents: SimpleNamespace = Depends(get_agents)
+):
+    """Get customer segmentation data (refreshed in the background)"""
     try:
-        segments = context_agent.get_customer_segments()
+        segments = request.app.state.customer_segments
+        if segments is None:
+            # First refresh has not finished yet
+            segments = agents.context.get_customer_segments()
         return segments
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -400,11 +544,12 @@ async def get_customer_segments():
 
 # Demo Endpoints
 @app.post("/demo/setup-sample-data")
-async def setup_sample_data(db: Session = Depends(get_database)):
+async def setup_sample_data(
+    db: AsyncSession = Depends(get_async_db),
+    agents: SimpleNamespace = Depends(get_agents),
+):
     """Set up sample data for demo purposes"""
     try:
-        from src.models import Customer, Loan
-
         # Create sample customers
         customers_data = [
             {
@@ -427,13 +572,12 @@ async def setup_sample_data(db: Session = Depends(get_database)):
             },
         ]
 
-        created_customers = []
-        for customer_data in customers_data:
-            customer = Customer(**customer_data)
-            db.add(customer)
-            db.commit()
-            db.refresh(customer)
-            created_customers.append(customer)
+        created_customers = [
+            Customer(**customer_data) for customer_data in customers_data
+        ]
+        db.add_all(created_customers)
+        # Flush to assign customer ids for the loans below
+        await db.flush()
 
         # Create sample loans
         loans_data = [
@@ -463,10 +607,12 @@ async def setup_sample_data(db: Session = Depends(get_database)):
             },
         ]
 
-        for loan_data in loans_data:
-            loan = Loan(**loan_data)
-            db.add(loan)
-            db.commit()
+        db.add_all([Loan(**loan_data) for loan_data in loans_data])
+        await db.commit()
+        await asyncio.to_thread(
+            agents.context.refresh_risk_scores,
+            [customer.id for customer in created_customers],
+        )
 
         return {
             "status": "success",
@@ -480,28 +626,29 @@ async def setup_sample_data(db: Session = Depends(get_database)):
 
 
 @app.get("/demo/test-workflow")
-async def test_demo_workflow():
+async def test_demo_workflow(agents: SimpleNamespace = Depends(get_agents)):
     """Test the complete workflow with sample data"""
     try:
         # Step 1: Check due EMIs
-        due_emis = trigger_agent.check_due_emis()
+        due_emis = agents.trigger.check_due_emis()
 
         if not due_emis:
             return {"message": "No due EMIs found. Please setup sample data first."}
 
         # Step 2: Get customer context for first due EMI
         customer_id = due_emis[0]["customer_id"]
-        customer_context = context_agent.get_customer_context(customer_id)
+        customer_context = agents.context.get_customer_context(customer_id)
 
-        # Step 3: Simulate voice call
-        call_result = voicebot_agent.initiate_call(customer_context, due_emis[0])
-
-        # Step 4: Create payment link
+        # Steps 3 and 4: Simulate voice call and create payment link concurrently
         loan_info = {"loan_id": 1, "emi_amount": due_emis[0]["emi_amount"]}
-        payment_link = payment_agent.create_payment_link(customer_context, loan_info)
+        call_result, payment_link = await asyncio.gather(
+            agents.voicebot.initiate_call(customer_context, due_emis[0]),
+            agents.payment.create_payment_link_async(customer_context, loan_info),
+        )
+        agents.context.invalidate_customer_context(customer_id)
 
         # Step 5: Log everything
-        logging_agent.log_interaction(
+        agents.logging.log_interaction(
             {
                 "customer_id": customer_id,
                 "call_id": call_result.get("call_id"),
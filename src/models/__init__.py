@@ -7,11 +7,13 @@ from sqlalchemy import (
     Boolean,
     Text,
     ForeignKey,
+    Index,
+    func,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from enum import Enum
 
@@ -58,6 +60,7 @@ class Customer(Base):
 
 class Loan(Base):
     __tablename__ = "loans"
+    __table_args__ = (Index("ix_loans_customer_status", "customer_id", "status"),)
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
@@ -75,23 +78,30 @@ class Loan(Base):
 
 class CustomerInteraction(Base):
     __tablename__ = "customer_interactions"
+    __table_args__ = (
+        Index("ix_interactions_customer_created", "customer_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
-    call_id = Column(String, unique=True)
+    call_id = Column(String, unique=True, index=True)
     interaction_type = Column(String)  # voice_call, sms, whatsapp
     conversation_log = Column(Text)
     sentiment_score = Column(Float)
     outcome = Column(String)  # payment_made, promised_payment, no_response, etc.
     call_duration = Column(Integer)  # in seconds
+    summary = Column(Text)
     status = Column(String, default=CallStatus.PENDING)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=func.now(), server_default=func.now())
 
     customer = relationship("Customer", back_populates="interactions")
 
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_loan_created_status", "loan_id", "created_at", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     loan_id = Column(Integer, ForeignKey("loans.id"))
@@ -100,7 +110,7 @@ class Payment(Base):
     transaction_id = Column(String, unique=True)
     status = Column(String, default=PaymentStatus.PENDING)
     payment_date = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=func.now(), server_default=func.now())
 
     loan = relationship("Loan", back_populates="payments")
 
@@ -123,8 +133,7 @@ class CustomerResponse(CustomerBase):
     status: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class LoanBase(BaseModel):
@@ -144,8 +153,7 @@ class LoanResponse(LoanBase):
     status: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class InteractionCreate(BaseModel):
@@ -163,8 +171,7 @@ class InteractionResponse(InteractionCreate):
     status: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PaymentCreate(BaseModel):
@@ -180,5 +187,4 @@ class PaymentResponse(PaymentCreate):
     payment_date: Optional[datetime] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,8 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import scoped_session, sessionmaker, Session
+from sqlalchemy.pool import NullPool
 from src.models import Base
 import os
 from dotenv import load_dotenv
@@ -8,18 +11,55 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./emi_voicebot.db")
 
+# Connection pool settings for the PostgreSQL engines
+POOL_OPTIONS = {
+    "pool_size": 20,
+    "max_overflow": 40,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+    "pool_timeout": 5,
+}
+
+# "postgres" is a common alias for the dialect that SQLAlchemy rejects
+_url = make_url(DATABASE_URL)
+_backend, _, _driver = _url.drivername.partition("+")
+IS_POSTGRESQL = _backend in ("postgres", "postgresql")
+
 # For demo purposes, we'll use SQLite
-if "postgresql" in DATABASE_URL:
+if IS_POSTGRESQL:
     # Use PostgreSQL settings
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(
+        _url.set(drivername=f"postgresql+{_driver}" if _driver else "postgresql"),
+        **POOL_OPTIONS,
+    )
 else:
     # Use SQLite for demo
     engine = create_engine(
         "sqlite:///./emi_voicebot.db", connect_args={"check_same_thread": False}
     )
 
+# Async engine for the API handlers, on the same database
+if IS_POSTGRESQL:
+    async_engine = create_async_engine(
+        _url.set(drivername="postgresql+asyncpg"), **POOL_OPTIONS
+    )
+else:
+    # SQLite serializes writes anyway, so pooling connections buys nothing
+    async_engine = create_async_engine(
+        "sqlite+aiosqlite:///./emi_voicebot.db", poolclass=NullPool
+    )
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Thread-local session for helpers run in worker threads; remove it when done
+ScopedSession = scoped_session(
+    sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+)
+
 
 def get_database():
     """Dependency to get database session"""
@@ -30,11 +70,57 @@ def get_database():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Columns added to existing tables, as (table, column); create_all only
+# creates missing tables, so these are added to older databases on startup
+ADDED_COLUMNS = (("customer_interactions", "summary"),)
+
+
 def create_tables():
-    """Create all database tables"""
+    """Create all database tables and add any missing columns and indexes"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    create_missing_indexes()
+
+
+def add_missing_columns():
+    """Add ADDED_COLUMNS to tables created before they existed"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, column_name in ADDED_COLUMNS:
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            if column_name in existing:
+                continue
+
+            column = Base.metadata.tables[table_name].c[column_name]
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(
+                text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
+            )
+
+
+def create_missing_indexes():
+    """Create model indexes that tables created before them do not have"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
 def get_db_session() -> Session:
     """Get a database session"""
     return SessionLocal()
+
+
+def get_scoped_session() -> Session:
+    """Get the thread-local database session"""
+    return ScopedSession()
+
+
+def remove_scoped_session():
+    """Close and discard the thread-local database session"""
+    ScopedSession.remove()
@@ -0,0 +1,29 @@
+"""
+Outbound message dispatch across SMS and WhatsApp channels
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+ChannelSender = Callable[[str, str], Awaitable[Dict]]
+
+
+class MessageDispatcher:
+    """
+    Sends a message over several channels concurrently.
+    Each channel is an async sender taking (destination, message).
+    """
+
+    def __init__(self, channels: Dict[str, ChannelSender]):
+        self._channel = channels
+
+    async def broadcast(self, destinations: Dict[str, str], message: str) -> Dict:
+        """
+        Send the same message to each {channel: destination} pair at once.
+        Returns the per-channel send results keyed by channel name.
+        """
+        channels = list(destinations)
+        results = await asyncio.gather(
+            *[self._channel[c](destinations[c], message) for c in channels]
+        )
+        return dict(zip(channels, results))
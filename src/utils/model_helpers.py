@@ -4,6 +4,7 @@ Utility functions to handle SQLAlchemy model attribute access properly
 
 from typing import Any, Optional
 from datetime import datetime
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from src.models import Customer, Loan, Payment, CustomerInteraction
 
@@ -19,8 +20,8 @@ def safe_float(value: Any) -> float:
     """
     Safely convert value to float, handling SQLAlchemy columns
     """
-    if hasattr(value, "__float__"):
-        return float(value)
+    if value is None:
+        return 0.0
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -31,8 +32,8 @@ def safe_int(value: Any) -> int:
     """
     Safely convert value to int, handling SQLAlchemy columns
     """
-    if hasattr(value, "__int__"):
-        return int(value)
+    if value is None:
+        return 0
     try:
         return int(value)
     except (TypeError, ValueError):
@@ -72,54 +73,24 @@ def get_payment_statistics(db: Session, loan_ids: list, cutoff_date) -> dict:
     """
     Get payment statistics using proper SQLAlchemy queries
     """
-    # Get all payments
-    all_payments = (
-        db.query(Payment)
-        .filter(Payment.loan_id.in_(loan_ids), Payment.created_at >= cutoff_date)
-        .all()
-    )
-
-    # Count by status using SQL queries for accuracy
-    successful_count = (
-        db.query(Payment)
-        .filter(
-            Payment.loan_id.in_(loan_ids),
-            Payment.created_at >= cutoff_date,
-            Payment.status == "completed",
-        )
-        .count()
-    )
-
-    failed_count = (
-        db.query(Payment)
-        .filter(
-            Payment.loan_id.in_(loan_ids),
-            Payment.created_at >= cutoff_date,
-            Payment.status == "failed",
-        )
-        .count()
-    )
-
-    # Get completed payments for amount calculation
-    completed_payments = (
-        db.query(Payment)
-        .filter(
-            Payment.loan_id.in_(loan_ids),
-            Payment.created_at >= cutoff_date,
-            Payment.status == "completed",
+    # Count and sum payments per status in one aggregate query
+    rows = db.execute(
+        select(
+            Payment.status,
+            func.count(Payment.id),
+            func.coalesce(func.sum(Payment.amount), 0.0),
         )
-        .all()
-    )
+        .where(Payment.loan_id.in_(loan_ids), Payment.created_at >= cutoff_date)
+        .group_by(Payment.status)
+    ).all()
 
-    total_amount = 0.0
-    for payment in completed_payments:
-        try:
-            amount = safe_float(payment.amount)
-            total_amount += amount
-        except:
-            continue
+    counts = {status: count for status, count, _ in rows}
+    amounts = {status: amount for status, _, amount in rows}
 
-    total_payments = len(all_payments)
+    successful_count = counts.get("completed", 0)
+    failed_count = counts.get("failed", 0)
+    total_amount = float(amounts.get("completed", 0.0))
+    total_payments = sum(counts.values())
 
     return {
         "total_payments": total_payments,
@@ -141,26 +112,11 @@ def calculate_total_outstanding(loans: list) -> float:
     """
     Calculate total outstanding amount from loan objects
     """
-    total = 0.0
-    for loan in loans:
-        try:
-            amount = safe_float(loan.outstanding_amount)
-            total += amount
-        except:
-            continue
-    return total
+    return sum(loan.outstanding_amount or 0.0 for loan in loans)
 
 
 def filter_active_loans(loans: list) -> list:
     """
     Filter active loans from list of loan objects
     """
-    active_loans = []
-    for loan in loans:
-        try:
-            status = safe_str(loan.status)
-            if status == "active":
-                active_loans.append(loan)
-        except:
-            continue
-    return active_loans
+    return [loan for loan in loans if loan.status == "active"]
